@@ -1,12 +1,19 @@
-from flask import Flask, request, jsonify, render_template
-import subprocess
-import json
-import requests
+from flask import Flask, Response, jsonify, request
+from concurrent.futures import TimeoutError as FutureTimeoutError, as_completed
 import os
 import logging
-import re
+import atexit
+import threading
 from dotenv import load_dotenv
 
+from browser_pool import BrowserPool
+from chapter_store import ChapterStore
+from jobs import JobQueue, QueueFullError
+from metrics import render as render_metrics
+from scrape_wattpad import discover_parts, scrape_chapter
+from story_batch import StoryBatch
+from summarizer import summary_backend, summary_cache
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,278 +22,154 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, template_folder='.')
+app = Flask(__name__)
 
 UPLOAD_FOLDER = "uploads"
 # Make sure uploads folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Groq API credentials
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
-GROQ_MODEL = "llama3-8b-8192"  
-
-@app.route('/')
-def home():
-    return render_template('index.html')
-
-def clean_text(text):
-    """Clean up text to reduce token count."""
-    # Replace multiple newlines with single newline
-    text = re.sub(r'\n\s*\n', '\n', text)
-    # Remove excessive spaces
-    text = re.sub(r' +', ' ', text)
-    # Remove redundant punctuation 
-    text = re.sub(r'\.{3,}', '...', text)
-    # Strip leading/trailing whitespace
-    return text.strip()
-
-def summarize_with_groq(text, chapter_title):
-    """Send text to Groq API for summarization."""
-    try:
-        logger.info(f"Summarizing using Groq API: {chapter_title}")
-        
-        # Clean and optimize the text
-        text = clean_text(text)
-        
-        # Calculate approximate token count (rough estimate: 4 chars ≈ 1 token)
-        estimated_tokens = len(text) // 4
-        logger.info(f"Estimated token count: {estimated_tokens}")
-        
-        # If text is too long, truncate it to fit within limits
-        # Llama3-8b-8192 has a context window of about 8192 tokens, but we need room for the prompt and output
-        max_input_tokens = 5000  # Allow buffer for prompt and output
-        
-        if estimated_tokens > max_input_tokens:
-            logger.warning(f"Text too long ({estimated_tokens} est. tokens), truncating to ~{max_input_tokens} tokens")
-            # Truncate text to approximately max_input_tokens
-            text = text[:max_input_tokens * 4]
-            logger.info(f"Truncated text to {len(text)} characters")
-        
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Prepare the prompt for the API
-        prompt = f"""This is a chapter of a Wattpad story. Read the entire chapter carefully and summarize it in a story format.
-
-        IMPORTANT: Pay special attention to character names, places, and key terms exactly as they appear in the original text. Do not substitute or change any proper nouns. Do not change any character relationships and dynamics exactly as presented.
-
-        Ensure the summary is a rich, immersive retelling that mirrors the original narrative while maintaining its tone, style, and pacing in a seamless flow.
-
-        The summary must be approximately 1000-1500 words long, preserving the authenticity of the original chapter.
-
-        Do not introduce any new storylines, subplots, or additional details that are not in the original text.
-
-        Output only the summary—no introductory or concluding remarks, no explanations about word count, and no analysis.
-
-        Chapter Title: {chapter_title}
-
-        Chapter Content:
-        {text}
-        """
-        
-        payload = {
-            "model": GROQ_MODEL,
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that provides high-quality summaries of fiction content."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
-        
-        logger.info("Sending request to Groq API")
-        response = requests.post(GROQ_API_ENDPOINT, headers=headers, json=payload, timeout=60)
-        
-        if response.status_code != 200:
-            logger.error(f"Groq API error: {response.status_code} - {response.text}")
-            return None, f"Groq API error: {response.status_code}"
-        
-        result = response.json()
-        summary = result["choices"][0]["message"]["content"]
-        
-        logger.info(f"Successfully received summary from Groq API, length: {len(summary)} characters")
-        return summary, None
-        
-    except Exception as e:
-        logger.exception(f"Error in summarize_with_groq: {str(e)}")
-        return None, f"Failed to summarize: {str(e)}"
+# Scraping timeout, same budget the old scraper subprocess had
+SCRAPE_TIMEOUT = int(os.getenv("SCRAPE_TIMEOUT", 300))
+
+# Background workers for /story jobs
+job_queue = JobQueue()
+
+# Scraped chapters, so repeat requests skip the browser
+chapter_store = ChapterStore()
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Return the process-wide browser pool, starting it on first use."""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool()
+            _browser_pool.start()
+            atexit.register(_browser_pool.close)
+        return _browser_pool
+
+@app.route('/metrics')
+def metrics():
+    """Stage timings and counters in the Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Report summary cache hit/miss counters for sizing the cache."""
+    return jsonify(summary_cache.stats())
+    
+@app.route('/backends/stats')
+def backend_stats():
+    """Report each summary backend's latency, error rate and breaker state."""
+    return jsonify(summary_backend.stats())
     
-@app.route('/summarize', methods=['GET','POST'])
-def summarize_text():
-    """Send text file content to Groq API and return the summary."""
+def stored_chapter(url):
+    """Return a current stored chapter for url, or None."""
     try:
-        # Check if it's POST or GET and handle data accordingly
-        if request.method == 'POST':
-            if request.is_json:
-                data = request.json
-            else:
-                # If Content-Type is not application/json
-                return jsonify({"error": "Content-Type must be application/json"}), 415
-        else:  # GET method
-            # For GET requests, get data from query parameters
-            filename = request.args.get("filename", "")
-            data = {"filename": filename}
-        
-        filename = data.get("filename", "")
-        
-        logger.info(f"Summarizing file: {filename}")
-
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if not filename or not os.path.exists(file_path):
-            logger.error(f"File not found: {file_path}")
-            return jsonify({"error": f"File not found: {filename}"}), 400
+        return chapter_store.get(url)
+    except Exception as e:
+        logger.warning(f"Chapter store lookup failed: {str(e)}")
+        return None
 
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-            logger.info(f"Read file content, length: {len(content)} characters")
-            
-        # Extract the chapter title (first line of the file)
-        lines = content.split('\n')
-        chapter_title = lines[0].strip()
-        
-        # The rest is the text content
-        text = '\n'.join(lines[1:]).strip()
-            
-        # Call Groq API for summarization
-        summary, error = summarize_with_groq(text, chapter_title)
-        
-        if error:
-            return jsonify({"error": error}), 500
-            
-        if not summary:
-            logger.error("No summary generated from API")
-            return jsonify({"error": "No summary generated from API"}), 500
-            
-        logger.info(f"Generated summary of length: {len(summary)} characters")
-        
-        # Format the summary to make it more narrative-like
-        formatted_summary = summary.replace("\n\n", "<br><br>")
-        
-        return jsonify({"summary": formatted_summary, "file_path": file_path})
-        
+def store_chapter(url, scraped):
+    """Keep a freshly scraped chapter for repeat requests."""
+    if "error" in scraped:
+        return
+    try:
+        chapter_store.put(url, scraped["title"], scraped["text"], scraped.get("modified"))
     except Exception as e:
-        logger.exception(f"Error in summarize_text: {str(e)}")
-        return jsonify({"error": f"Failed to summarize: {str(e)}"}), 500
+        logger.warning(f"Failed to store chapter: {str(e)}")
+
+def summarize_story(job, story_url):
+    """Scrape every part of a story and summarize them; returns (result, error)."""
+    pool = get_browser_pool()
 
-@app.route('/scrape', methods=['POST'])
-def scrape():
+    job.set_stage("discovering")
+    try:
+        story = pool.run(discover_parts, story_url, timeout=SCRAPE_TIMEOUT)
+    except FutureTimeoutError:
+        logger.error(f"Story discovery timed out after {SCRAPE_TIMEOUT} seconds")
+        return None, "Scraping timed out"
+
+    if "error" in story:
+        logger.error(f"Error discovering story parts: {story['error']}")
+        return None, story["error"]
+
+    parts = story["parts"]
+    logger.info(f"Scraping {len(parts)} parts of {story['title']}")
+    job.set_stage("scraping")
+
+    # Parts are spread over the pooled browsers and summarized as each one lands
+    batch = StoryBatch()
+    futures = {}
+    for index, part in enumerate(parts):
+        stored = stored_chapter(part["url"])
+        if stored is not None:
+            batch.add(index, {"url": part["url"], "title": part["title"], **stored})
+        else:
+            futures[pool.submit(scrape_chapter, part["url"])] = (index, part)
+
+    for future in as_completed(futures):
+        index, part = futures[future]
+        try:
+            scraped = future.result()
+        except Exception as e:
+            logger.exception(f"Error scraping part {index + 1}: {str(e)}")
+            scraped = {"error": f"Scraping error: {str(e)}"}
+        store_chapter(part["url"], scraped)
+        batch.add(index, {"url": part["url"], "title": part["title"], **scraped})
+
+    job.set_stage("summarizing")
+    results = batch.results()
+    failed = sum(1 for result in results if "error" in result)
+    logger.info(f"Story batch finished: {len(results) - failed} parts summarized, {failed} failed")
+
+    return {
+        "message": "Story scraping and summarization complete!",
+        "title": story["title"],
+        "parts": results
+    }, None
+
+@app.route('/story', methods=['POST'])
+def story():
+    """Queue a job that summarizes every part of a story and return its ID."""
     try:
         data = request.json
-        url = data.get('url', '')
+        url = data.get('url', '').strip()
 
         if not url:
             logger.error("No URL provided")
             return jsonify({"error": "No URL provided"}), 400
 
-        logger.info(f"Scraping URL: {url}")
-        
-        # Run the scraping script with the URL
-        result = subprocess.run(
-            ["python3", "scrape_wattpad.py", url], 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True,
-            timeout=300
-        )
-
-        # Log the output of the scraping script
-        logger.info(f"Scraping script stdout: {result.stdout}")
-        if result.stderr:
-            logger.warning(f"Scraping script stderr: {result.stderr}")
-
-        if result.returncode != 0:
-            logger.error(f"Scraping script failed with return code {result.returncode}")
-            return jsonify({
-                "error": "Scraping script failed", 
-                "details": result.stderr
-            }), 500
-            
-        # Parse the JSON output from the scraping script
         try:
-            scrape_output = json.loads(result.stdout.strip()) if result.stdout.strip() else {}
-            
-            # Log the entire scrape output for debugging
-            logger.info(f"Scraping script output: {scrape_output}")
-            
-            if "error" in scrape_output:
-                logger.error(f"Error from scraping script: {scrape_output['error']}")
-                return jsonify({"error": scrape_output["error"]}), 500
-                
-            chapter_title = scrape_output.get("title", "Untitled Chapter")
-            filename = scrape_output.get("filename", "")
-            
-            # Add validation for empty filename
-            if not filename:
-                logger.error("No filename returned from scraping script")
-                return jsonify({"error": "Failed to save file - no filename returned"}), 500
-            
-            # Validate file exists before proceeding
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            if not os.path.exists(file_path):
-                logger.error(f"Scraped file not found at path: {file_path}")
-                return jsonify({"error": "Scraped file not found"}), 500
-            
-            logger.info(f"Successfully scraped chapter: {chapter_title} to file: {filename}")
-            
-            # Make internal request to summarize endpoint
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-                logger.info(f"Read file content, length: {len(content)} characters")
-                
-            # Extract the chapter title (first line of the file)
-            lines = content.split('\n')
-            chapter_title = lines[0].strip()
-            
-            # The rest is the text content
-            text = '\n'.join(lines[1:]).strip()
-                
-            # Call Groq API for summarization
-            summary, error = summarize_with_groq(text, chapter_title)
-            
-            if error:
-                logger.error(f"Summarization error: {error}")
-                return jsonify({"error": error}), 500
-                
-            if not summary:
-                logger.error("No summary generated from API")
-                return jsonify({"error": "No summary generated from API"}), 500
-                
-            # Format the summary
-            formatted_summary = summary.replace("\n\n", "<br><br>")
-
-            # Now that we have the summary, delete the file
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Successfully deleted file: {file_path}")
-                else:
-                    logger.warning(f"File not found for deletion: {file_path}")
-            except Exception as del_err:
-                logger.warning(f"Failed to delete file {file_path}: {str(del_err)}")
-                # Continue anyway - non-fatal error
+            job, created = job_queue.submit(f"story:{url}", summarize_story, url)
+        except QueueFullError as e:
+            logger.warning(str(e))
+            return jsonify({"error": "Server is busy, please try again shortly"}), 429, {"Retry-After": "5"}
 
-            logger.info("Successfully generated summary")
-            return jsonify({
-                "message": "Scraping and summarization complete!",
-                "title": chapter_title,
-                "summary": formatted_summary
-            })
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}"
+        }), 202 if created else 200
 
-        except json.JSONDecodeError as e:
-            logger.exception(f"JSON parsing error: {str(e)}")
-            return jsonify({
-                "error": "JSON parsing error", 
-                "details": str(e),
-                "raw_output": result.stdout
-            }), 500
-            
     except Exception as e:
-        logger.exception(f"Unexpected error in scrape: {str(e)}")
+        logger.exception(f"Unexpected error in story: {str(e)}")
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Return the status of a scrape job, and its result once finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
 if __name__ == '__main__':
+    # The page and the chapter routes are served by the async app, which mounts this one
+    import uvicorn
     port = int(os.getenv("PORT", 8080))
-    app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
+    uvicorn.run("asgi:app", host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,298 @@
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import os
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as flask_app
+from app import SCRAPE_TIMEOUT, UPLOAD_FOLDER, chapter_store, get_browser_pool, store_chapter, stored_chapter
+from jobs import JobQueue, QueueFullError
+from metrics import collect_timings, span
+from scrape_wattpad import scrape_chapter
+import summarizer
+from summarizer import RATE_LIMITED_ERROR, summarize_update, summarize_with_groq
+from text_cleaning import split_chapter
+
+logger = logging.getLogger(__name__)
+
+# Per-stage limits; requests beyond them wait their turn instead of piling onto one resource.
+# Summary requests are limited by ASYNC_SUMMARY_CONCURRENCY in summarizer.py.
+ASYNC_SCRAPE_CONCURRENCY = int(os.getenv("ASYNC_SCRAPE_CONCURRENCY", 8))
+ASYNC_DISK_CONCURRENCY = int(os.getenv("ASYNC_DISK_CONCURRENCY", 8))
+ASYNC_JOB_QUEUE_SIZE = int(os.getenv("ASYNC_JOB_QUEUE_SIZE", 512))
+# Threads serving the routes still handled by the Flask app (stories, stats, metrics)
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 16))
+
+# Seconds between keepalive comments on idle event streams
+SSE_KEEPALIVE_INTERVAL = 15
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html")
+
+scrape_semaphore = asyncio.Semaphore(ASYNC_SCRAPE_CONCURRENCY)
+disk_semaphore = asyncio.Semaphore(ASYNC_DISK_CONCURRENCY)
+
+job_queue = JobQueue(max_pending=ASYNC_JOB_QUEUE_SIZE)
+
+
+async def on_disk(fn, *args):
+    """Run a blocking store or file call in a thread, bounded by the disk semaphore."""
+    async with disk_semaphore:
+        return await asyncio.to_thread(fn, *args)
+
+
+def read_upload(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def wants_timings(value):
+    """Whether a request asked for a per-stage timing breakdown (``timings`` flag)."""
+    return value in (True, 1) or str(value).lower() in ("1", "true", "yes")
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def load_chapter(url, on_progress=None):
+    """Return ``(scraped, error)`` for url, from the chapter store or a pooled browser.
+
+    on_progress gets the name of each scrape phase as it starts.
+    """
+    with span("chapter_store"):
+        scrape_output = await on_disk(stored_chapter, url)
+    if scrape_output is not None:
+        if on_progress is not None:
+            on_progress("store")
+    else:
+        callback = None
+        if on_progress is not None:
+            # The scraper reports phases from the browser pool's own loop
+            loop = asyncio.get_running_loop()
+            callback = lambda stage: loop.call_soon_threadsafe(on_progress, stage)
+        with span("scrape"):
+            async with scrape_semaphore:
+                # The pooled browsers run Playwright's async API on their own loops
+                pool = await asyncio.to_thread(get_browser_pool)
+                future = await asyncio.to_thread(pool.submit, scrape_chapter, url, callback)
+                try:
+                    scrape_output = await asyncio.wait_for(asyncio.wrap_future(future), SCRAPE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.error(f"Scraping timed out after {SCRAPE_TIMEOUT} seconds")
+                    return None, "Scraping timed out"
+        await on_disk(store_chapter, url, scrape_output)
+
+    if "error" in scrape_output:
+        logger.error(f"Error from scraper: {scrape_output['error']}")
+        return None, scrape_output["error"]
+    return scrape_output, None
+
+
+async def scrape_and_summarize(job, url, want_timings=False):
+    """Scrape a chapter and summarize it; returns (result, error).
+
+    With want_timings the result carries the milliseconds spent per stage.
+    """
+    with collect_timings() as timings:
+        result, error = await _scrape_and_summarize(job, url)
+    if result is not None and want_timings:
+        result["timings"] = timings
+    return result, error
+
+
+async def _scrape_and_summarize(job, url):
+    logger.info(f"Scraping URL: {url}")
+    job.set_stage("scraping")
+
+    scrape_output, error = await load_chapter(url, lambda stage: job.publish("progress", {"stage": stage}))
+    if error:
+        return None, error
+
+    chapter_title = scrape_output.get("title", "Untitled Chapter")
+    text = scrape_output.get("text", "").strip()
+    logger.info(f"Successfully scraped chapter: {chapter_title}, length: {len(text)} characters")
+    job.publish("title", {"title": chapter_title})
+
+    job.set_stage("summarizing")
+    job.publish("progress", {"stage": "summarize"})
+    summary, error, update = await summarize_update(
+        chapter_store, url, text, chapter_title, lambda delta: job.publish("token", {"text": delta})
+    )
+
+    if error:
+        logger.error(f"Summarization error: {error}")
+        return None, error
+
+    if not summary:
+        logger.error("No summary generated from API")
+        return None, "No summary generated from API"
+
+    logger.info("Successfully generated summary")
+    job.publish("update", update)
+    return {
+        "message": "Scraping and summarization complete!",
+        "title": chapter_title,
+        "summary": summary.replace("\n\n", "<br><br>"),
+        "update": update
+    }, None
+
+
+async def home(request):
+    return FileResponse(INDEX_PATH)
+
+
+async def summarize_text(request: Request):
+    """Send text file content to Groq API and return the summary."""
+    try:
+        if request.method == "POST":
+            if request.headers.get("content-type", "").split(";")[0].strip() != "application/json":
+                return JSONResponse({"error": "Content-Type must be application/json"}, status_code=415)
+            data = await request.json()
+        else:
+            data = {"filename": request.query_params.get("filename", ""),
+                    "timings": request.query_params.get("timings")}
+
+        filename = data.get("filename", "")
+        logger.info(f"Summarizing file: {filename}")
+
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        if not filename or not os.path.exists(file_path):
+            logger.error(f"File not found: {file_path}")
+            return JSONResponse({"error": f"File not found: {filename}"}, status_code=400)
+
+        with collect_timings() as timings:
+            with span("read_upload"):
+                content = await on_disk(read_upload, file_path)
+            logger.info(f"Read file content, length: {len(content)} characters")
+            # The first line of the file is the chapter title, the rest is the text
+            chapter_title, text = split_chapter(content)
+
+            summary, error = await summarize_with_groq(text, chapter_title)
+        if error:
+            return JSONResponse({"error": error}, status_code=429 if error == RATE_LIMITED_ERROR else 500)
+        if not summary:
+            logger.error("No summary generated from API")
+            return JSONResponse({"error": "No summary generated from API"}, status_code=500)
+
+        logger.info(f"Generated summary of length: {len(summary)} characters")
+        response = {"summary": summary.replace("\n\n", "<br><br>"), "file_path": file_path}
+        if wants_timings(data.get("timings")):
+            response["timings"] = timings
+        return JSONResponse(response)
+
+    except Exception as e:
+        logger.exception(f"Error in summarize_text: {str(e)}")
+        return JSONResponse({"error": f"Failed to summarize: {str(e)}"}, status_code=500)
+
+
+async def scrape(request: Request):
+    """Start a scrape-and-summarize job and return its ID right away."""
+    try:
+        data = await request.json()
+        url = data.get('url', '').strip()
+
+        if not url:
+            logger.error("No URL provided")
+            return JSONResponse({"error": "No URL provided"}, status_code=400)
+
+        try:
+            job, created = job_queue.submit_async(url, scrape_and_summarize, url, wants_timings(data.get("timings")))
+        except QueueFullError as e:
+            logger.warning(str(e))
+            return JSONResponse({"error": "Server is busy, please try again shortly"},
+                                status_code=429, headers={"Retry-After": "5"})
+
+        return JSONResponse({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}"
+        }, status_code=202 if created else 200)
+
+    except Exception as e:
+        logger.exception(f"Unexpected error in scrape: {str(e)}")
+        return JSONResponse({"error": f"An unexpected error occurred: {str(e)}"}, status_code=500)
+
+
+async def scrape_stream(request: Request):
+    """Follow a chapter's scrape-and-summarize job, streaming progress and summary tokens as SSE.
+
+    The job is the one /scrape would start or join, so concurrent requests
+    for a URL share it and a full queue answers 429.
+    """
+    url = request.query_params.get("url", "").strip()
+    if not url:
+        logger.error("No URL provided")
+        return JSONResponse({"error": "No URL provided"}, status_code=400)
+
+    try:
+        job, _ = job_queue.submit_async(url, scrape_and_summarize, url)
+    except QueueFullError as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": "Server is busy, please try again shortly"},
+                            status_code=429, headers={"Retry-After": "5"})
+    logger.info(f"Streaming job {job.id} for URL: {url}")
+
+    async def generate():
+        events = job.subscribe()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield sse_event(*item)
+        finally:
+            job.unsubscribe(events)
+
+        if job.error:
+            yield sse_event("error", {"error": job.error})
+        else:
+            # Carries the whole summary for streams that joined after its tokens were sent
+            yield sse_event("done", {key: job.result[key] for key in ("title", "summary", "update")})
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+async def job_status(request: Request):
+    """Return the status of a scrape job, from either the async or the Flask queue."""
+    job_id = request.path_params["job_id"]
+    job = job_queue.get(job_id) or flask_app.job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Job not found: {job_id}"}, status_code=404)
+    return JSONResponse(job.to_dict())
+
+
+@asynccontextmanager
+async def lifespan(_):
+    # Summaries started by the Flask routes run on this loop too
+    summarizer.use_loop(asyncio.get_running_loop())
+    yield
+    await summarizer.summary_backend.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/summarize", summarize_text, methods=["GET", "POST"]),
+        Route("/scrape", scrape, methods=["POST"]),
+        Route("/scrape/stream", scrape_stream),
+        Route("/jobs/{job_id}", job_status),
+        # Everything else is served by the Flask app
+        Mount("/", WSGIMiddleware(flask_app.app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,330 @@
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from groq_client import (
+    GROQ_MAX_RETRIES, GROQ_RATE_LIMIT_DB, GROQ_REQUESTS_PER_MINUTE, GROQ_TIMEOUT, GROQ_TOKENS_PER_MINUTE,
+    AsyncGroqClient, GroqAPIError,
+)
+from metrics import BACKEND_BREAKER_OPEN, BACKEND_CALLS, BACKEND_HEDGES
+from rate_limit import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+# Routing: lowest smoothed latency wins, plus a penalty per unit of error rate
+BACKEND_EWMA_ALPHA = float(os.getenv("BACKEND_EWMA_ALPHA", 0.2))
+BACKEND_ERROR_PENALTY = float(os.getenv("BACKEND_ERROR_PENALTY", 10))
+# Hedging: after the primary's p95 latency, also ask the next backend and take the first answer
+BACKEND_HEDGE = os.getenv("BACKEND_HEDGE", "0") == "1"
+BACKEND_HEDGE_PERCENTILE = float(os.getenv("BACKEND_HEDGE_PERCENTILE", 95))
+BACKEND_HEDGE_MIN_SAMPLES = int(os.getenv("BACKEND_HEDGE_MIN_SAMPLES", 20))
+BACKEND_HEDGE_MIN_DELAY = float(os.getenv("BACKEND_HEDGE_MIN_DELAY", 0.5))
+# Circuit breaker: eject a backend after this many failures in a row, retry it after the cooldown
+BACKEND_BREAKER_FAILURES = int(os.getenv("BACKEND_BREAKER_FAILURES", 5))
+BACKEND_BREAKER_COOLDOWN = float(os.getenv("BACKEND_BREAKER_COOLDOWN", 30))
+
+
+class CircuitBreaker:
+    """Takes a backend out of rotation after ``failures`` failed calls in a row.
+
+    After ``cooldown`` seconds one probe call is let through; its success
+    closes the breaker and its failure opens it for another cooldown.
+    """
+
+    def __init__(self, failures=BACKEND_BREAKER_FAILURES, cooldown=BACKEND_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def available(self):
+        """Whether a call may be sent now; does not claim the probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            return not self.probing and time.monotonic() - self.opened_at >= self.cooldown
+
+    def begin(self):
+        """Mark a call as started; the first one after the cooldown becomes the probe."""
+        with self._lock:
+            if self.opened_at is not None and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+
+    def release(self):
+        """Give up the probe of a call that was cancelled before it finished."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, ok):
+        """Record a finished call; returns True if this opened the breaker."""
+        with self._lock:
+            self.probing = False
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return False
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failures:
+                opened = self.opened_at is None
+                self.opened_at = time.monotonic()
+                return opened
+            return False
+
+
+class BackendStats:
+    """Smoothed latency and error rate of a backend, plus recent latencies for percentiles.
+
+    Streamed calls are timed to their first token. They feed the smoothed
+    latency but not the percentiles, which size the hedge delay for whole
+    (non-streamed) answers.
+    """
+
+    def __init__(self, alpha=BACKEND_EWMA_ALPHA, window=200):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok, streamed=False):
+        with self._lock:
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            if seconds is None:
+                return
+            if not streamed:
+                self.recent.append(seconds)
+            self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+
+    def percentile(self, pct, min_samples=BACKEND_HEDGE_MIN_SAMPLES):
+        """pct-th percentile of recent latencies, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self.recent)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+    def score(self):
+        """Lower is better. Backends with no latency yet score 0, so each gets tried."""
+        return (self.latency or 0.0) + BACKEND_ERROR_PENALTY * self.error_rate
+
+
+class Backend:
+    """One OpenAI-compatible chat-completions endpoint and model, with its own quota."""
+
+    def __init__(self, name, endpoint, model, api_key=None, requests_per_minute=GROQ_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=GROQ_TOKENS_PER_MINUTE, max_retries=GROQ_MAX_RETRIES, timeout=GROQ_TIMEOUT):
+        self.name = name
+        self.endpoint = endpoint
+        self.model = model
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.stats = BackendStats()
+        self.breaker = CircuitBreaker()
+        self.limiter = TokenBucketLimiter(requests_per_minute, tokens_per_minute, GROQ_RATE_LIMIT_DB, name)
+        self.client = None
+
+    def _payload(self, payload):
+        return dict(payload, model=self.model) if self.model else payload
+
+    def _record(self, ok, seconds=None, streamed=False):
+        # Failures say nothing about how fast an answer comes, so only the error rate takes them
+        self.stats.record(seconds, ok, streamed)
+        BACKEND_CALLS.labels(self.name, "ok" if ok else "error").inc()
+        if self.breaker.record(ok):
+            logger.warning(f"Backend {self.name} failed {self.breaker.consecutive_failures} times in a row, "
+                           f"taking it out of rotation for {self.breaker.cooldown:.0f}s")
+        BACKEND_BREAKER_OPEN.labels(self.name).set(1 if self.breaker.is_open else 0)
+
+    async def chat_async(self, payload, tokens=None, on_delta=None):
+        """Send a request to this backend; the result's ``model`` is the model it was sent to.
+
+        Streamed requests (with ``on_delta``) are timed to their first token,
+        since they run as long as the summary. Cancelled requests are not
+        timed here; the router records the hedges it cancels.
+        """
+        if self.client is None:
+            self.client = AsyncGroqClient(self.endpoint, self.api_key, limiter=self.limiter,
+                                          max_retries=self.max_retries, timeout=self.timeout, name=self.name)
+        payload = self._payload(payload)
+        started = time.perf_counter()
+        first_token = None
+        relay = None
+        if on_delta is not None:
+            def relay(delta):
+                nonlocal first_token
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                on_delta(delta)
+
+        self.breaker.begin()
+        try:
+            result = await self.client.chat(payload, tokens, relay)
+        except asyncio.CancelledError:
+            BACKEND_CALLS.labels(self.name, "cancelled").inc()
+            self.breaker.release()
+            raise
+        except Exception:
+            # Anything else that ends the call, not just GroqAPIError, must settle a probe
+            self._record(False)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        elapsed = time.perf_counter() - started
+        self._record(True, first_token if first_token is not None else elapsed, streamed=on_delta is not None)
+        # Summaries are cached under the model that wrote them, whatever name the endpoint echoes back
+        result["model"] = payload.get("model")
+        return result
+
+    def describe(self):
+        latency = self.stats.latency
+        p95 = self.stats.percentile(95, min_samples=1)
+        return {
+            "name": self.name,
+            "endpoint": self.endpoint,
+            "model": self.model,
+            "latency_ewma_ms": round(latency * 1000, 1) if latency is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.stats.error_rate, 4),
+            "breaker_open": self.breaker.is_open,
+        }
+
+
+class BackendRouter:
+    """Sends each summary request to the best available backend.
+
+    Backends are ranked by smoothed latency plus an error-rate penalty, and
+    those with an open circuit breaker are skipped. A failed request moves
+    on to the next backend, unless it had already streamed part of its
+    answer. With hedging on, a non-streamed request still running after the
+    primary's p95 latency is also sent to the runner-up; the first good
+    answer wins and the other request is cancelled.
+    """
+
+    def __init__(self, backends, hedge=BACKEND_HEDGE):
+        if not backends:
+            raise ValueError("At least one summary backend is required")
+        self.backends = backends
+        self.hedge = hedge
+
+    @classmethod
+    def from_env(cls, default):
+        """Build the router from the SUMMARY_BACKENDS JSON list, or around default when it is unset."""
+        configured = os.getenv("SUMMARY_BACKENDS", "")
+        if not configured:
+            return cls([default])
+        backends = []
+        for config in json.loads(configured):
+            config = dict(config)
+            api_key_env = config.pop("api_key_env", None)
+            if api_key_env:
+                config["api_key"] = os.getenv(api_key_env)
+            backends.append(Backend(**config))
+        logger.info(f"Summary backends: {', '.join(backend.name for backend in backends)}")
+        return cls(backends)
+
+    def ranked(self):
+        """Backends in the order to try them; all of them if every breaker is open."""
+        available = [backend for backend in self.backends if backend.breaker.available()]
+        return sorted(available or self.backends, key=lambda backend: backend.stats.score())
+
+    def hedge_delay(self, backend):
+        """Seconds to wait on backend before hedging, or None if there is no basis for one yet."""
+        p95 = backend.stats.percentile(BACKEND_HEDGE_PERCENTILE)
+        return max(p95, BACKEND_HEDGE_MIN_DELAY) if p95 is not None else None
+
+    async def chat_async(self, payload, tokens=None, on_delta=None):
+        """Send a chat-completions request and return the decoded JSON body.
+
+        ``on_delta`` streams the answer as in AsyncGroqClient.chat().
+        """
+        order = self.ranked()
+        delay = None
+        if self.hedge and on_delta is None and len(order) > 1:
+            delay = self.hedge_delay(order[0])
+        if delay is None:
+            return await self._failover_async(order, payload, tokens, on_delta)
+
+        started = {}
+        first = asyncio.ensure_future(order[0].chat_async(payload, tokens))
+        started[first] = time.perf_counter()
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if first in done:
+            if first.exception() is None:
+                return first.result()
+            # Failed before the hedge delay: nothing to hedge, just fail over
+            logger.warning(f"Backend {order[0].name} failed: {str(first.exception())}")
+            return await self._failover_async(order[1:], payload, tokens)
+
+        logger.info(f"Backend {order[0].name} slower than {delay:.2f}s, hedging with {order[1].name}")
+        BACKEND_HEDGES.labels("fired").inc()
+        second = asyncio.ensure_future(order[1].chat_async(payload, tokens))
+        started[second] = time.perf_counter()
+        backend_of = {first: order[0], second: order[1]}
+        pending = {first, second}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            BACKEND_HEDGES.labels("won").inc()
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+                # The loser's time so far is still a lower bound on its backend's latency
+                backend_of[task].stats.record(time.perf_counter() - started[task], True)
+        if len(order) > 2:
+            return await self._failover_async(order[2:], payload, tokens)
+        raise last_error
+
+    async def _failover_async(self, order, payload, tokens, on_delta=None):
+        streamed = False
+
+        def relay(delta):
+            nonlocal streamed
+            streamed = True
+            on_delta(delta)
+
+        last_error = None
+        for backend in order:
+            try:
+                return await backend.chat_async(payload, tokens, relay if on_delta is not None else None)
+            except GroqAPIError as e:
+                logger.warning(f"Backend {backend.name} failed: {str(e)}")
+                # Part of the answer has already gone to the caller
+                if streamed:
+                    raise
+                last_error = e
+        raise last_error
+
+    def models(self):
+        """Models of all configured backends, any of which may answer a request."""
+        return list(dict.fromkeys(backend.model for backend in self.backends))
+
+    def stats(self):
+        return {"hedging": self.hedge, "backends": [backend.describe() for backend in self.backends]}
+
+    async def close(self):
+        for backend in self.backends:
+            if backend.client is not None:
+                await backend.client.close()
+                backend.client = None
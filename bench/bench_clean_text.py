@@ -0,0 +1,88 @@
+"""Benchmark clean_text() and split_chapter() against the original multi-pass versions.
+
+Builds synthetic chapters of increasing size, checks that the current
+normalizer (one regex pass, then str.replace loops) gives exactly the same
+output as the original re.sub passes, and reports throughput for both.
+tests/test_text_cleaning.py runs the same equivalence check under pytest.
+
+    python bench/bench_clean_text.py --sizes 10000,100000,1000000 --repeat 20
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from text_cleaning import clean_text, split_chapter
+
+WORDS = (
+    "she he they said whispered ran looked door window night rain heart "
+    "\"Wait!\" \"No...\" why? yes. okay, Jimin Taehyung Seoul 사랑해 ¿qué? ..... ....."
+).split()
+
+
+def reference_clean_text(text):
+    """clean_text() as it was before the str.replace rewrite."""
+    text = re.sub(r'\n\s*\n', '\n', text)
+    text = re.sub(r' +', ' ', text)
+    text = re.sub(r'\.{3,}', '...', text)
+    return text.strip()
+
+
+def reference_split_chapter(content):
+    lines = content.split('\n')
+    return lines[0].strip(), '\n'.join(lines[1:]).strip()
+
+
+def synthetic_chapter(size, seed=0):
+    """A chapter of about size characters with Wattpad-like spacing quirks."""
+    rng = random.Random(seed)
+    paragraphs = ["  Chapter 12: The Rain  "]
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 80))]
+        paragraph = (" " * rng.choice((1, 1, 1, 2, 4))).join(words)
+        paragraphs.append(paragraph + " " * rng.choice((0, 0, 3)))
+        length += len(paragraph)
+    separators = ["\n", "\n\n", "\n \n", "\n\n\n", "\n\t\n"]
+    return "".join(p + rng.choice(separators) for p in paragraphs)
+
+
+def throughput(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    elapsed = (time.perf_counter() - start) / repeat
+    return elapsed, len(text) / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chapter text normalizer")
+    parser.add_argument("--sizes", default="10000,100000,500000,1000000",
+                        help="Comma-separated chapter sizes in characters")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per size")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'old ms':>9} {'new ms':>9} {'old MB/s':>9} {'new MB/s':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        content = synthetic_chapter(size)
+
+        if split_chapter(content) != reference_split_chapter(content):
+            sys.exit(f"split_chapter() output differs at size {size}")
+        _, text = split_chapter(content)
+        if clean_text(text) != reference_clean_text(text):
+            sys.exit(f"clean_text() output differs at size {size}")
+
+        old = lambda c: reference_clean_text(reference_split_chapter(c)[1])
+        new = lambda c: clean_text(split_chapter(c)[1])
+        old_time, old_rate = throughput(old, content, args.repeat)
+        new_time, new_rate = throughput(new, content, args.repeat)
+        print(f"{len(content):>10} {old_time * 1000:>9.2f} {new_time * 1000:>9.2f} "
+              f"{old_rate:>9.1f} {new_rate:>9.1f} {old_time / new_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
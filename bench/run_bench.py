@@ -0,0 +1,317 @@
+"""Benchmark /scrape or /summarize end to end against local stub servers.
+
+Starts the stub Wattpad and chat-completions servers and the app, then drives
+the chosen endpoint at a fixed concurrency. It reports latency percentiles,
+throughput, peak memory per app process and the peak number of Chromium
+processes. Nothing leaves the machine. Chapters, stub latencies and 429s are
+all seeded, so runs with the same arguments are comparable. Pass --baseline
+with an earlier --output file to fail on regressions.
+
+    python bench/run_bench.py --target summarize --requests 200 --concurrency 50
+    python bench/run_bench.py --target scrape --requests 40 --concurrency 8 --output scrape.json
+    python bench/run_bench.py --target scrape --baseline scrape.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_wattpad import StubWattpad
+
+# First part ID used for benchmark chapters; every request gets its own chapter
+FIRST_PART_ID = 900000
+# Lower is better for these results; throughput is checked the other way round
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_worker_rss_mb", "peak_chromium_processes")
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def start(cmd, env=None):
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def read_proc_tree(root_pid):
+    """Return ``[(pid, cmdline, rss_kb)]`` for root_pid and all its descendants, from /proc."""
+    children = {}
+    info = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                stat = file.read()
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as file:
+                cmdline = file.read().replace(b"\0", b" ").decode(errors="replace")
+            with open(f"/proc/{entry}/status") as file:
+                rss = next((int(line.split()[1]) for line in file if line.startswith("VmRSS:")), 0)
+        except (OSError, ValueError, IndexError):
+            continue
+        pid = int(entry)
+        children.setdefault(ppid, []).append(pid)
+        info[pid] = (cmdline, rss)
+
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in info:
+            tree.append((pid, *info[pid]))
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the app's process tree while the benchmark runs."""
+
+    def __init__(self, root_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_worker_rss_kb = 0
+        self.peak_total_rss_kb = 0
+        self.peak_chromium = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+        self.sample()
+
+    def sample(self):
+        tree = read_proc_tree(self.root_pid)
+        chromium = [rss for _, cmdline, rss in tree if "chrom" in cmdline or "headless_shell" in cmdline]
+        workers = [rss for _, cmdline, rss in tree if "python" in cmdline or "uvicorn" in cmdline or "gunicorn" in cmdline]
+        self.peak_chromium = max(self.peak_chromium, len(chromium))
+        self.peak_worker_rss_kb = max([self.peak_worker_rss_kb] + workers)
+        self.peak_total_rss_kb = max(self.peak_total_rss_kb, sum(rss for _, _, rss in tree))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def write_uploads(stub, count, pages):
+    """Write count chapters in the uploads format (title line, then text); returns their filenames."""
+    os.makedirs(os.path.join(REPO_DIR, "uploads"), exist_ok=True)
+    filenames = []
+    for index in range(count):
+        part_id = str(FIRST_PART_ID + index)
+        paragraphs = [p for page in range(1, pages + 1) for p in stub.paragraphs(part_id, page)]
+        filename = f"bench_{part_id}.txt"
+        with open(os.path.join(REPO_DIR, "uploads", filename), "w", encoding="utf-8") as file:
+            file.write(stub.title(part_id) + "\n" + "\n\n".join(paragraphs))
+        filenames.append(filename)
+    return filenames
+
+
+async def scrape_once(client, url, poll_interval):
+    response = await client.post("/scrape", json={"url": url})
+    if response.status_code not in (200, 202):
+        return f"HTTP {response.status_code}"
+    status_url = response.json()["status_url"]
+    while True:
+        await asyncio.sleep(poll_interval)
+        job = (await client.get(status_url)).json()
+        if job["status"] == "done":
+            return None
+        if job["status"] == "failed":
+            return job.get("error") or "failed"
+
+
+async def summarize_once(client, filename):
+    response = await client.post("/summarize", json={"filename": filename})
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}"
+    return None
+
+
+async def drive(base_url, target, items, concurrency, poll_interval):
+    """Run one request per item with at most concurrency in flight; returns (latencies, errors, wall)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600, limits=limits) as client:
+        async def one(item):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    if target == "scrape":
+                        error = await scrape_once(client, item, poll_interval)
+                    else:
+                        error = await summarize_once(client, item)
+                except httpx.HTTPError as e:
+                    error = f"{type(e).__name__}: {str(e)}"
+                latencies.append((time.perf_counter() - started) * 1000)
+                if error:
+                    errors.append(error)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(item) for item in items))
+        wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of results that are worse than baseline by more than tolerance."""
+    regressions = []
+    for key in LOWER_IS_BETTER:
+        old, new = baseline.get(key), results.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old} -> {new}")
+    old, new = baseline.get("throughput_rps"), results.get("throughput_rps")
+    if old and new is not None and new < old * (1 - tolerance):
+        regressions.append(f"throughput_rps: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the summarizer against local stub servers")
+    parser.add_argument("--target", choices=("scrape", "summarize"), default="summarize")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2, help="Requests sent first and left out of the results")
+    parser.add_argument("--app-cmd", default=f"{sys.executable} -m uvicorn asgi:app --host 127.0.0.1 --port {{port}}",
+                        help="Command that serves the app; {port} is filled in")
+    parser.add_argument("--app-port", type=int, default=8200)
+    parser.add_argument("--wattpad-port", type=int, default=8201)
+    parser.add_argument("--llm-port", type=int, default=8202)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-429", type=float, default=0.0, help="Share of completions rejected with 429")
+    parser.add_argument("--pages-per-chapter", type=int, default=4)
+    parser.add_argument("--page-delay", type=float, default=0.1)
+    parser.add_argument("--no-api", action="store_true", help="Make the scraper render every page")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="Seconds between /jobs polls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    stub = StubWattpad(args.pages_per_chapter, 30)
+    total = args.warmup + args.requests
+    store_dir = tempfile.mkdtemp(prefix="wattpad-bench-")
+    env = dict(
+        os.environ,
+        GROQ_API_KEY="bench",
+        GROQ_API_ENDPOINT=f"http://127.0.0.1:{args.llm_port}/v1/chat/completions",
+        GROQ_BACKOFF_BASE=os.getenv("GROQ_BACKOFF_BASE", "0.2"),
+        WATTPAD_DOMAIN="127.0.0.1",
+        CHAPTER_STORE_DB=os.path.join(store_dir, "chapters.db"),
+        SUMMARY_CACHE_DB="",
+    )
+    # Quotas only limit the benchmark when asked for explicitly
+    env.setdefault("GROQ_REQUESTS_PER_MINUTE", "0")
+    env.setdefault("GROQ_TOKENS_PER_MINUTE", "0")
+
+    processes = [
+        start([sys.executable, os.path.join(BENCH_DIR, "stub_wattpad.py"), "--port", str(args.wattpad_port),
+               "--pages-per-chapter", str(args.pages_per_chapter), "--page-delay", str(args.page_delay)]
+              + (["--no-api"] if args.no_api else [])),
+        start([sys.executable, os.path.join(BENCH_DIR, "stub_llm.py"), "--port", str(args.llm_port),
+               "--latency", str(args.llm_latency), "--jitter", str(args.llm_jitter),
+               "--rate-429", str(args.llm_429), "--seed", str(args.seed)]),
+    ]
+    filenames = []
+    try:
+        app = start(shlex.split(args.app_cmd.format(port=args.app_port)), env=env)
+        processes.append(app)
+        for port in (args.wattpad_port, args.llm_port, args.app_port):
+            wait_for_port(port)
+
+        if args.target == "scrape":
+            items = [f"http://127.0.0.1:{args.wattpad_port}/{FIRST_PART_ID + i}-bench-chapter" for i in range(total)]
+        else:
+            items = filenames = write_uploads(stub, total, args.pages_per_chapter)
+
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        if args.warmup:
+            asyncio.run(drive(base_url, args.target, items[:args.warmup], args.warmup, args.poll_interval))
+
+        sampler = ResourceSampler(app.pid)
+        sampler.start()
+        latencies, errors, wall = asyncio.run(
+            drive(base_url, args.target, items[args.warmup:], args.concurrency, args.poll_interval)
+        )
+        sampler.stop()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for filename in filenames:
+            os.remove(os.path.join(REPO_DIR, "uploads", filename))
+
+    latencies.sort()
+    results = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "wall_s": round(wall, 2),
+        "peak_worker_rss_mb": round(sampler.peak_worker_rss_kb / 1024, 1),
+        "peak_total_rss_mb": round(sampler.peak_total_rss_kb / 1024, 1),
+        "peak_chromium_processes": sampler.peak_chromium,
+    }
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+
+    for key, value in results.items():
+        print(f"{key:>24}: {value}")
+    if errors:
+        print(f"{'first error':>24}: {errors[0].splitlines()[0]}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"config": config, "results": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with different settings")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
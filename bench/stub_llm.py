@@ -0,0 +1,103 @@
+"""Stub OpenAI-compatible chat-completions server for benchmarks.
+
+Answers after a configurable latency and rejects a configurable share of
+requests with 429 and a Retry-After header. Latency jitter and 429s come
+from a seeded generator, so a run with the same settings and request order
+sees the same responses.
+
+    python bench/stub_llm.py --port 8202 --latency 0.8 --jitter 0.2 --rate-429 0.05
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+SUMMARY_WORDS = "the story follows her as she waits through the long night for him to return".split()
+
+
+def make_handler(args):
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status, body, headers=()):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with rng_lock:
+                rejected = rng.random() < args.rate_429
+                latency = max(args.latency + rng.uniform(-args.jitter, args.jitter), 0.0)
+
+            if rejected:
+                return self.send_json(429, {"error": {"message": "Rate limit reached"}},
+                                      [("Retry-After", str(args.retry_after))])
+
+            prompt_tokens = sum(len(message["content"]) for message in payload["messages"]) // 4
+            completion_tokens = min(payload.get("max_tokens", 1000), args.completion_tokens)
+            words = [SUMMARY_WORDS[i % len(SUMMARY_WORDS)] for i in range(completion_tokens)]
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+
+            if not payload.get("stream"):
+                time.sleep(latency)
+                return self.send_json(200, {
+                    "choices": [{"message": {"role": "assistant", "content": " ".join(words)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            # Stream the same words spread over the latency
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            delay = latency / max(len(words), 1)
+            for word in words:
+                time.sleep(delay)
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {"choices": [], "x_groq": {"usage": usage}}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub chat-completions API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8202)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to the latency")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with a 429")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Words in each summary")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"Stub chat completions listening on http://{args.host}:{args.port}/v1/chat/completions", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
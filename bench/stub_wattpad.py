@@ -0,0 +1,154 @@
+"""Local stand-in for Wattpad chapter pages and the API endpoints the scraper uses.
+
+Chapters are generated deterministically from their part ID, so every run
+serves the same text. A chapter page renders its first page of paragraphs
+and lazily fetches the rest from /apiv2/storytext as the reader scrolls,
+like the real site. Pages recorded from Wattpad can be served instead by
+pointing --pages at a directory of <part_id>.html files.
+
+    python bench/stub_wattpad.py --port 8201 [--no-api] [--page-delay 0.2]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import html
+import json
+import os
+import random
+import re
+import time
+
+WORDS = (
+    "she he they said whispered ran looked door window night rain heart hand "
+    "smiled turned away again never always maybe before after quietly slowly"
+).split()
+
+PAGE_SCRIPT = """<script>
+(() => {
+  const partId = %(part_id)s;
+  const pages = %(pages)s;
+  let next = 2;
+  let loading = false;
+  async function loadMore() {
+    if (loading || next > pages) return;
+    if (window.innerHeight + window.scrollY < document.body.scrollHeight - 200) return;
+    loading = true;
+    const response = await fetch(`/apiv2/storytext?id=${partId}&page=${next}`);
+    const pre = document.createElement('pre');
+    pre.innerHTML = await response.text();
+    document.querySelector('.page-content').appendChild(pre);
+    next += 1;
+    loading = false;
+    loadMore();
+  }
+  window.addEventListener('scroll', loadMore);
+})();
+</script>"""
+
+
+class StubWattpad:
+    """Deterministic chapters: paragraph counts and text depend only on the part ID."""
+
+    def __init__(self, pages_per_chapter, paragraphs_per_page, pages_dir=None):
+        self.pages_per_chapter = pages_per_chapter
+        self.paragraphs_per_page = paragraphs_per_page
+        self.pages_dir = pages_dir
+
+    def title(self, part_id):
+        return f"Chapter {part_id}: The Long Night"
+
+    def paragraphs(self, part_id, page):
+        rng = random.Random(f"{part_id}:{page}")
+        return [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 90))).capitalize() + "."
+            for _ in range(self.paragraphs_per_page)
+        ]
+
+    def story_text(self, part_id, page):
+        if page > self.pages_per_chapter:
+            return ""
+        return "".join(f"<p>{html.escape(p)}</p>" for p in self.paragraphs(part_id, page))
+
+    def chapter_page(self, part_id):
+        if self.pages_dir:
+            path = os.path.join(self.pages_dir, f"{part_id}.html")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as file:
+                    return file.read()
+        return (
+            f"<!DOCTYPE html><html><head><title>{self.title(part_id)}</title></head><body>"
+            f"<h1 class=\"h2\">{html.escape(self.title(part_id))}</h1>"
+            f"<div class=\"page-content\"><pre>{self.story_text(part_id, 1)}</pre></div>"
+            + PAGE_SCRIPT % {"part_id": part_id, "pages": self.pages_per_chapter}
+            + "</body></html>"
+        )
+
+
+def make_handler(stub, api_enabled, page_delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send(self, status, body, content_type):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+
+            match = re.match(r"/api/v3/story_parts/(\d+)$", url.path)
+            if match:
+                if not api_enabled:
+                    return self.send(404, "{}", "application/json")
+                part_id = match.group(1)
+                return self.send(200, json.dumps({
+                    "id": int(part_id),
+                    "title": stub.title(part_id),
+                    "pages": stub.pages_per_chapter,
+                    "modifyDate": "2024-01-01T00:00:00Z",
+                }), "application/json")
+
+            # Also serves the page's own lazy loading, so it stays up with --no-api
+            if url.path == "/apiv2/storytext":
+                time.sleep(page_delay)
+                part_id = query.get("id", [""])[0]
+                page = int(query.get("page", ["1"])[0])
+                return self.send(200, stub.story_text(part_id, page), "text/html")
+
+            match = re.match(r"/(\d+)(?:-[^/]*)?$", url.path)
+            if match:
+                return self.send(200, stub.chapter_page(match.group(1)), "text/html; charset=utf-8")
+
+            self.send(404, "Not found", "text/plain")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub Wattpad chapters for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8201)
+    parser.add_argument("--pages-per-chapter", type=int, default=4)
+    parser.add_argument("--paragraphs-per-page", type=int, default=30)
+    parser.add_argument("--page-delay", type=float, default=0.1,
+                        help="Seconds each lazily loaded page of text takes to arrive")
+    parser.add_argument("--no-api", action="store_true",
+                        help="Answer the part API with 404 so the scraper renders every page")
+    parser.add_argument("--pages", help="Directory of recorded <part_id>.html chapter pages")
+    args = parser.parse_args()
+
+    stub = StubWattpad(args.pages_per_chapter, args.paragraphs_per_page, args.pages)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub, not args.no_api, args.page_delay))
+    print(f"Stub Wattpad listening on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
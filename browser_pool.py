@@ -0,0 +1,295 @@
+from playwright.async_api import async_playwright
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import asyncio
+import threading
+import logging
+import os
+import time
+
+from metrics import BROWSER_PEAK_RSS, BROWSER_RSS, BROWSER_TEARDOWNS, record, span
+from resource_limits import PageSlots, browser_rss_bytes, browser_temp_dir, peak_rss_bytes
+from scrape_wattpad import launch_browser, new_context
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_PAGES_PER_BROWSER = int(os.getenv("BROWSER_PAGES_PER_BROWSER", 4))
+BROWSER_PAGES_PER_CONTEXT = int(os.getenv("BROWSER_PAGES_PER_CONTEXT", 20))
+BROWSER_HEALTH_CHECK_INTERVAL = float(os.getenv("BROWSER_HEALTH_CHECK_INTERVAL", 30))
+# Limits that tear pages and browsers down early; 0 disables each of them
+BROWSER_TASK_TIMEOUT = float(os.getenv("BROWSER_TASK_TIMEOUT", 120))
+BROWSER_CONTEXT_MAX_AGE = float(os.getenv("BROWSER_CONTEXT_MAX_AGE", 600))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1024))
+
+
+class BrowserSlot(threading.Thread):
+    """Worker thread running an event loop that owns one Chromium browser.
+
+    Playwright objects are bound to the loop that created them, so every
+    browser lives on its own thread and pages are only ever touched there.
+    Up to ``pages_per_browser`` pages run concurrently in the browser, each
+    also holding one of the machine-wide ``page_slots``. A browser that grows
+    past ``BROWSER_MAX_RSS_MB`` stops taking pages and is restarted once its
+    open pages finish.
+    """
+
+    def __init__(self, index, pages_per_browser, pages_per_context, page_slots):
+        super().__init__(name=f"browser-slot-{index}", daemon=True)
+        self.index = index
+        self.pages_per_browser = pages_per_browser
+        self.pages_per_context = pages_per_context
+        self.page_slots = page_slots
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.active_tasks = 0
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.context_started = 0.0
+        self.pages_served = 0
+        self.temp_dir = None
+        self.peak_rss = 0
+        self._context_pages = {}
+        self._semaphore = None
+        self._launch_lock = None
+        self._accepting = None
+        self._restart_pending = False
+        self._health_task = None
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._start())
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to start Playwright: {str(e)}")
+        finally:
+            self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self._shutdown())
+        self.loop.close()
+
+    def submit(self, fn, *args):
+        """Schedule ``await fn(page, *args)`` and return a concurrent Future."""
+        self.ready.wait()
+        self.active_tasks += 1
+        future = asyncio.run_coroutine_threadsafe(self._run_task(fn, args, time.perf_counter()), self.loop)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _task_done(self, _):
+        self.active_tasks -= 1
+
+    async def _start(self):
+        self._semaphore = asyncio.Semaphore(self.pages_per_browser)
+        self._launch_lock = asyncio.Lock()
+        self._accepting = asyncio.Event()
+        self._accepting.set()
+        self.playwright = await async_playwright().start()
+        # Launch eagerly so the first request finds a warm browser
+        await self._try_health_check()
+        self._health_task = self.loop.create_task(self._health_check_loop())
+
+    async def _shutdown(self):
+        if self._health_task:
+            self._health_task.cancel()
+        await self._close_browser()
+        if self.playwright:
+            await self.playwright.stop()
+
+    async def _run_task(self, fn, args, submitted):
+        async with self._semaphore:
+            await self._accepting.wait()
+            page_slot = await self.page_slots.acquire()
+            try:
+                # Time spent waiting for a free page in this browser and on the machine
+                record("pool_wait", time.perf_counter() - submitted)
+                return await self._run_page(fn, args)
+            finally:
+                self.page_slots.release(page_slot)
+
+    async def _run_page(self, fn, args):
+        try:
+            await self._health_check()
+            with span("page_open"):
+                page, context = await self._new_page()
+        except Exception:
+            await self._try_health_check()
+            raise
+        try:
+            return await asyncio.wait_for(fn(page, *args), BROWSER_TASK_TIMEOUT or None)
+        except asyncio.TimeoutError:
+            BROWSER_TEARDOWNS.labels("task_timeout").inc()
+            logger.warning(f"[{self.name}] Page task exceeded {BROWSER_TASK_TIMEOUT:g}s, closing its page")
+            raise FutureTimeoutError(f"Page task exceeded {BROWSER_TASK_TIMEOUT:g} seconds")
+        finally:
+            await self._close_page(page, context)
+            await self._check_memory()
+            # Replace the browser now if the task crashed it
+            await self._try_health_check()
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(BROWSER_HEALTH_CHECK_INTERVAL)
+            await self._check_memory()
+            await self._try_health_check()
+
+    async def _check_memory(self):
+        """Record the browser's RSS and schedule a restart if it is over the limit."""
+        if self.browser is None or self.temp_dir is None:
+            return
+        rss = await asyncio.to_thread(browser_rss_bytes, self.temp_dir)
+        BROWSER_RSS.labels(self.name).set(rss)
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+            BROWSER_PEAK_RSS.labels(self.name).set(rss)
+
+        if BROWSER_MAX_RSS_MB > 0 and rss > BROWSER_MAX_RSS_MB * 1024 * 1024 and not self._restart_pending:
+            logger.warning(f"[{self.name}] Browser uses {rss / 2**20:.0f} MB, over the {BROWSER_MAX_RSS_MB} MB "
+                           f"limit; restarting it once its pages close")
+            BROWSER_TEARDOWNS.labels("memory").inc()
+            self._restart_pending = True
+            self._accepting.clear()
+        if self._restart_pending and not any(self._context_pages.values()):
+            await self._restart()
+
+    async def _restart(self):
+        self._restart_pending = False
+        try:
+            async with self._launch_lock:
+                await self._close_browser()
+            await self._try_health_check()
+        finally:
+            self._accepting.set()
+
+    async def _health_check(self):
+        """Restart the browser if it has crashed or was never started."""
+        async with self._launch_lock:
+            if self.browser is not None and self.browser.is_connected():
+                return
+            if self.browser is not None:
+                logger.warning(f"[{self.name}] Browser disconnected, restarting")
+            await self._close_browser()
+            with span("browser_launch"):
+                self.temp_dir = browser_temp_dir()
+                self.browser = await launch_browser(self.playwright, self.temp_dir)
+            logger.info(f"[{self.name}] Browser launched")
+
+    async def _try_health_check(self):
+        try:
+            await self._health_check()
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to restart browser: {str(e)}")
+            self.browser = None
+
+    async def _new_page(self):
+        """Open a page, moving to a fresh context once the current one has served enough pages.
+
+        A retired context is closed when the last of its pages closes.
+        """
+        expired = BROWSER_CONTEXT_MAX_AGE > 0 and time.monotonic() - self.context_started >= BROWSER_CONTEXT_MAX_AGE
+        if self.context is not None and (self.pages_served >= self.pages_per_context or expired):
+            logger.info(f"[{self.name}] Recycling context after {self.pages_served} pages")
+            if expired:
+                BROWSER_TEARDOWNS.labels("context_age").inc()
+            retired = self.context
+            self.context = None
+            if self._context_pages.get(retired, 0) == 0:
+                await self._close_context(retired)
+
+        if self.context is None:
+            self.context = await new_context(self.browser)
+            self._context_pages[self.context] = 0
+            self.context_started = time.monotonic()
+            self.pages_served = 0
+
+        context = self.context
+        self.pages_served += 1
+        self._context_pages[context] += 1
+        return await context.new_page(), context
+
+    async def _close_page(self, page, context):
+        try:
+            await page.close()
+        except Exception as e:
+            logger.warning(f"[{self.name}] Failed to close page: {str(e)}")
+        if context not in self._context_pages:
+            return
+        self._context_pages[context] -= 1
+        if context is not self.context and self._context_pages[context] == 0:
+            await self._close_context(context)
+
+    async def _close_context(self, context):
+        self._context_pages.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.warning(f"[{self.name}] Error closing context: {str(e)}")
+
+    async def _close_browser(self):
+        for context in list(self._context_pages):
+            await self._close_context(context)
+        self.context = None
+        self.pages_served = 0
+        try:
+            if self.browser:
+                await self.browser.close()
+        except Exception as e:
+            logger.warning(f"[{self.name}] Error closing browser: {str(e)}")
+        self.browser = None
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browsers that run page tasks for the app.
+
+    ``submit(fn, *args)`` schedules the coroutine ``fn(page, *args)`` on the
+    least busy browser and returns a concurrent Future with its result.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, pages_per_browser=BROWSER_PAGES_PER_BROWSER,
+                 pages_per_context=BROWSER_PAGES_PER_CONTEXT):
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.pages_per_context = pages_per_context
+        self.page_slots = PageSlots()
+        self.slots = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.slots:
+                return
+            logger.info(f"Starting browser pool with {self.size} browsers")
+            for index in range(self.size):
+                slot = BrowserSlot(index, self.pages_per_browser, self.pages_per_context, self.page_slots)
+                slot.start()
+                self.slots.append(slot)
+
+    def submit(self, fn, *args):
+        self.start()
+        with self._lock:
+            slot = min(self.slots, key=lambda s: s.active_tasks)
+            return slot.submit(fn, *args)
+
+    def run(self, fn, *args, timeout=None):
+        """Run ``fn(page, *args)`` on a pooled browser and wait for the result."""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        with self._lock:
+            for slot in self.slots:
+                slot.stop()
+            for slot in self.slots:
+                slot.join(timeout=10)
+            peak_browser = max((slot.peak_rss for slot in self.slots), default=0)
+            self.slots = []
+            logger.info(f"Browser pool closed; peak RSS {peak_rss_bytes() / 2**20:.0f} MB for this process, "
+                        f"{peak_browser / 2**20:.0f} MB for one browser")
@@ -0,0 +1,239 @@
+"""Summarize a backlog of chapter files offline.
+
+Chapters are read lazily from a directory of uploads-format ``.txt`` files
+(title on the first line, text after it), a tar archive of them, or a JSONL
+file of ``{"id", "title", "text"}`` (or ``{"id", "content"}``) records. Each
+one is cleaned with clean_text() and summarized through summarizer.py's
+backends, so the configured quotas still apply; the web app is not loaded.
+Results are appended to a JSONL file as they finish; that file is also the
+checkpoint, so rerunning the same command skips chapters already summarized
+and retries the failed ones. A chapter that cannot be read gets an error
+record like a failed summary, and the run goes on.
+
+    python3 bulk_summarize.py uploads/ --output summaries.jsonl --concurrency 4
+    python3 bulk_summarize.py chapters.tar.gz --output summaries.jsonl
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import argparse
+import json
+import logging
+import os
+import sys
+import tarfile
+import time
+
+from summarizer import run_sync, summarize_cleaned
+from text_cleaning import clean_text, split_chapter
+from token_budget import count_tokens
+
+logger = logging.getLogger("bulk_summarize")
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10
+
+
+def unreadable(chapter_id, error):
+    return chapter_id, "", None, f"Could not read chapter: {error}"
+
+
+def read_directory(path):
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if name.endswith(".txt") and os.path.isfile(file_path):
+            try:
+                with open(file_path, "r", encoding="utf-8") as file:
+                    content = file.read()
+            except (OSError, UnicodeDecodeError) as e:
+                yield unreadable(name, e)
+                continue
+            yield name, *split_chapter(content), None
+
+
+def read_tar(path):
+    # Stream mode reads the archive front to back without loading its index
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(".txt"):
+                try:
+                    content = archive.extractfile(member).read().decode("utf-8")
+                except UnicodeDecodeError as e:
+                    yield unreadable(member.name, e)
+                    continue
+                yield member.name, *split_chapter(content), None
+
+
+def read_jsonl(path):
+    with open(path, "rb") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            chapter_id = f"line-{number}"
+            try:
+                record = json.loads(line.decode("utf-8"))
+                chapter_id = str(record.get("id", chapter_id))
+                if "content" in record:
+                    chapter = (chapter_id, *split_chapter(record["content"]), None)
+                else:
+                    chapter = (chapter_id, record.get("title", "Untitled Chapter"), record["text"], None)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                chapter = unreadable(chapter_id, f"{type(e).__name__}: {e}")
+            yield chapter
+
+
+def read_chapters(path):
+    """Yield ``(id, title, text, error)`` for every chapter in path, whichever input format it is.
+
+    error is None unless the chapter could not be read, in which case text is None.
+    """
+    if os.path.isdir(path):
+        return read_directory(path)
+    if path.endswith((".jsonl", ".ndjson")):
+        return read_jsonl(path)
+    if tarfile.is_tarfile(path):
+        return read_tar(path)
+    raise ValueError(f"Not a directory, tar archive or JSONL file: {path}")
+
+
+def load_checkpoint(output):
+    """Return the IDs already summarized in output, making sure it ends on a full line."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as file:
+        last_line = b""
+        for last_line in file:
+            try:
+                record = json.loads(last_line)
+            except ValueError:
+                # A line cut short by an interrupted run; that chapter is redone
+                continue
+            if "summary" in record:
+                done.add(record["id"])
+            else:
+                done.discard(record["id"])
+        if last_line and not last_line.endswith(b"\n"):
+            file.write(b"\n")
+    return done
+
+
+def summarize_chapter(chapter_id, title, text):
+    """Clean and summarize one chapter and return its output record."""
+    started = time.perf_counter()
+    # Cleaned once here, so the token count is of the text actually summarized
+    text = clean_text(text)
+    tokens = count_tokens(text)
+    summary, error = run_sync(summarize_cleaned(text, title))
+    record = {"id": chapter_id, "title": title, "input_tokens": tokens}
+    if error or not summary:
+        record["error"] = error or "No summary generated from API"
+    else:
+        record["summary"] = summary
+        record["summary_tokens"] = count_tokens(summary)
+    record["seconds"] = round(time.perf_counter() - started, 2)
+    return record
+
+
+class Progress:
+    """Counts finished chapters and tokens, and logs throughput."""
+
+    def __init__(self, skipped):
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.input_tokens = 0
+        self.summary_tokens = 0
+
+    def add(self, record):
+        if "error" in record:
+            self.failed += 1
+        else:
+            self.done += 1
+            self.input_tokens += record["input_tokens"]
+            self.summary_tokens += record["summary_tokens"]
+        if time.perf_counter() - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = time.perf_counter()
+            report = self.report()
+            logger.info(f"{report['summarized']} summarized, {report['failed']} failed; "
+                        f"{report['chapters_per_second']} chapters/s, {report['tokens_per_second']} tokens/s")
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "summarized": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "seconds": round(elapsed, 1),
+            "chapters_per_second": round(self.done / elapsed, 3),
+            "tokens_per_second": round((self.input_tokens + self.summary_tokens) / elapsed, 1),
+            "input_tokens": self.input_tokens,
+            "summary_tokens": self.summary_tokens,
+        }
+
+
+def run(args):
+    done = load_checkpoint(args.output)
+    if done:
+        logger.info(f"Resuming: {len(done)} chapters in {args.output} are already summarized")
+    progress = Progress(len(done))
+
+    pending = set()
+    status = 0
+    with open(args.output, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bulk-summary") as executor:
+
+        def write(record):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            progress.add(record)
+            if "error" in record:
+                logger.warning(f"Failed to summarize {record['id']}: {record['error']}")
+
+        def write_finished(futures):
+            for future in futures:
+                write(future.result())
+
+        try:
+            submitted = 0
+            for chapter_id, title, text, error in read_chapters(args.input):
+                if chapter_id in done:
+                    continue
+                if args.limit and submitted >= args.limit:
+                    break
+                if error:
+                    write({"id": chapter_id, "title": title, "error": error})
+                    submitted += 1
+                    continue
+                # Keep only a few chapters per worker in memory, however large the input is
+                if len(pending) >= args.concurrency * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    write_finished(finished)
+                pending.add(executor.submit(summarize_chapter, chapter_id, title, text))
+                submitted += 1
+        except KeyboardInterrupt:
+            logger.warning("Interrupted, finishing the chapters in progress; rerun the same command to resume")
+            for future in pending:
+                future.cancel()
+            status = 130
+        write_finished(future for future in wait(pending).done if not future.cancelled())
+
+    return progress.report(), status or (1 if progress.failed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a directory, tar archive or JSONL file of chapters.")
+    parser.add_argument("input", help="directory of .txt chapters, tar archive of them, or a .jsonl file")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to; also the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="chapters summarized at once")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many new chapters")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report, status = run(args)
+    print(json.dumps(report))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
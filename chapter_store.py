@@ -0,0 +1,197 @@
+from urllib.parse import urlsplit
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+import requests
+
+from metrics import CACHE_LOOKUPS, UPSTREAM_RESPONSES
+from scrape_wattpad import normalize_url, part_id_from_url
+
+logger = logging.getLogger(__name__)
+
+# Chapter store configuration
+CHAPTER_STORE_DB = os.getenv("CHAPTER_STORE_DB", "chapters.db")
+CHAPTER_STORE_MAX_BYTES = int(os.getenv("CHAPTER_STORE_MAX_BYTES", 200 * 1024 * 1024))
+# Chapters validated more recently than this are served without asking Wattpad
+CHAPTER_FRESH_SECONDS = float(os.getenv("CHAPTER_FRESH_SECONDS", 600))
+# Chapters that cannot be revalidated are served until they are this old
+CHAPTER_MAX_AGE = float(os.getenv("CHAPTER_MAX_AGE", 24 * 3600))
+
+PART_MODIFIED_API = "/api/v3/story_parts/{part_id}?fields=modifyDate"
+
+
+def chapter_key(url):
+    """Canonical store key for a chapter URL: its part ID, or the bare URL."""
+    url, error = normalize_url(url)
+    if error:
+        return None
+    part_id = part_id_from_url(url)
+    if part_id:
+        return f"part:{part_id}"
+    parts = urlsplit(url)
+    return f"url:{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def fetch_part_modified(url):
+    """Fetch a part's last-modified stamp from the Wattpad API, or None."""
+    url, error = normalize_url(url)
+    part_id = part_id_from_url(url) if not error else None
+    if not part_id:
+        return None
+    origin = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+    try:
+        response = requests.get(origin + PART_MODIFIED_API.format(part_id=part_id), timeout=5)
+        UPSTREAM_RESPONSES.labels("wattpad_api", str(response.status_code)).inc()
+        if response.status_code != 200:
+            logger.info(f"Part metadata returned {response.status_code} for {url}")
+            return None
+        return response.json().get("modifyDate")
+    except Exception as e:
+        logger.warning(f"Part metadata lookup failed for {url}: {str(e)}")
+        return None
+
+
+class ChapterStore:
+    """Durable store of scraped chapters keyed by canonical part ID.
+
+    Each entry keeps the title, text, fetch time, content hash and the
+    part's modified stamp, plus the last summary and the paragraphs it was
+    made from, which survive re-scrapes so edits can be summarized
+    incrementally. Repeat requests are served from here; an entry
+    older than ``CHAPTER_FRESH_SECONDS`` is revalidated against the part
+    metadata instead of re-rendering the page. The store is trimmed to
+    ``CHAPTER_STORE_MAX_BYTES`` by evicting least recently used chapters.
+    """
+
+    def __init__(self, db_path=CHAPTER_STORE_DB, max_bytes=CHAPTER_STORE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chapters ("
+                "key TEXT PRIMARY KEY, url TEXT NOT NULL, title TEXT NOT NULL, text TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL, modified TEXT, size INTEGER NOT NULL, "
+                "fetched_at REAL NOT NULL, validated_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "summary_source TEXT, summary TEXT)"
+            )
+            # Stores created before summaries were kept lack their columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chapters)")}
+            for column in ("summary_source", "summary"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE chapters ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS chapters_accessed ON chapters (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, url):
+        """Return the stored chapter for url if it is still current, else None."""
+        key = chapter_key(url)
+        if key is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT title, text, content_hash, modified, fetched_at, validated_at "
+                "FROM chapters WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            CACHE_LOOKUPS.labels("chapter", "miss").inc()
+            return None
+
+        title, text, content_hash, modified, fetched_at, validated_at = row
+        now = time.time()
+        if now - validated_at > CHAPTER_FRESH_SECONDS:
+            current = fetch_part_modified(url)
+            if current is not None and current != modified:
+                logger.info(f"Stored chapter {key} changed upstream ({modified} -> {current})")
+                CACHE_LOOKUPS.labels("chapter", "changed").inc()
+                return None
+            if current is None and now - fetched_at > CHAPTER_MAX_AGE:
+                logger.info(f"Stored chapter {key} could not be revalidated and is too old")
+                CACHE_LOOKUPS.labels("chapter", "expired").inc()
+                return None
+            validated_at = now if current is not None else validated_at
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE chapters SET accessed_at = ?, validated_at = ? WHERE key = ?",
+                (now, validated_at, key),
+            )
+        CACHE_LOOKUPS.labels("chapter", "hit").inc()
+        logger.info(f"Serving chapter {key} from the chapter store")
+        return {
+            "title": title,
+            "text": text,
+            "content_hash": content_hash,
+            "fetched_at": fetched_at,
+            "stats": {"source": "store"},
+        }
+
+    def put(self, url, title, text, modified=None):
+        """Store a freshly scraped chapter and trim the store to its size limit."""
+        key = chapter_key(url)
+        if key is None:
+            return None
+        if modified is None:
+            modified = fetch_part_modified(url)
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        size = len(text.encode("utf-8")) + len(title.encode("utf-8"))
+        now = time.time()
+        with self._connect() as conn:
+            # Keeps the summary of the previous version for summarize_update()
+            conn.execute(
+                "INSERT INTO chapters (key, url, title, text, content_hash, modified, size, "
+                "fetched_at, validated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                "text = excluded.text, content_hash = excluded.content_hash, modified = excluded.modified, "
+                "size = excluded.size + COALESCE(LENGTH(CAST(summary_source AS BLOB)), 0) "
+                "+ COALESCE(LENGTH(CAST(summary AS BLOB)), 0), fetched_at = excluded.fetched_at, "
+                "validated_at = excluded.validated_at, accessed_at = excluded.accessed_at",
+                (key, url, title, text, content_hash, modified, size, now, now, now),
+            )
+            self._evict(conn)
+        return content_hash
+
+    def summary_base(self, url):
+        """Return ``(paragraphs, summary)`` for the last summarized version of url, or None."""
+        key = chapter_key(url)
+        if key is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary_source, summary FROM chapters WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return row[0].split('\n'), row[1]
+
+    def put_summary(self, url, paragraphs, summary):
+        """Keep summary as the summary of the chapter version made of paragraphs."""
+        key = chapter_key(url)
+        if key is None:
+            return
+        source = '\n'.join(paragraphs)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE chapters SET summary_source = ?, summary = ?, "
+                "size = LENGTH(CAST(text AS BLOB)) + LENGTH(CAST(title AS BLOB)) + ? WHERE key = ?",
+                (source, summary, len(source.encode("utf-8")) + len(summary.encode("utf-8")), key),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM chapters").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM chapters ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM chapters WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} chapters from the chapter store")
@@ -0,0 +1,211 @@
+from email.utils import parsedate_to_datetime
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from metrics import UPSTREAM_RESPONSES, span
+from rate_limit import TokenBucketLimiter
+from token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Client configuration
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", 16))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 4))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", 1.0))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", 30.0))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", 60))
+# Our Groq quota; the limiter keeps us under both
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", 30000))
+# SQLite file that lets every worker process share one limiter
+GROQ_RATE_LIMIT_DB = os.getenv("GROQ_RATE_LIMIT_DB", "")
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GroqAPIError(Exception):
+    """A request to the chat-completions API failed after all retries."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rate_limited(self):
+        return self.status_code == 429
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None):
+    """Seconds to wait before retry number attempt + 1."""
+    delay = min(GROQ_BACKOFF_BASE * (2 ** attempt), GROQ_BACKOFF_MAX)
+    delay = random.uniform(delay / 2, delay)
+    if response is not None:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+    return delay
+
+
+def estimate_request_tokens(payload):
+    """Token cost of a request for the limiter: prompt plus max output."""
+    prompt_tokens = sum(count_tokens(message["content"]) for message in payload["messages"])
+    return prompt_tokens + payload.get("max_tokens", 0)
+
+
+class AsyncGroqClient:
+    """Chat-completions client with pooled connections, retries and rate limiting.
+
+    One ``httpx.AsyncClient`` is reused so connections (and TLS sessions)
+    stay warm. 429 and 5xx responses and connection errors are retried with
+    exponential backoff and jitter, waiting at least as long as Retry-After
+    asks. Every attempt first takes its request and estimated tokens from
+    the shared token-bucket limiter.
+    """
+
+    def __init__(self, endpoint, api_key, limiter=None, max_retries=GROQ_MAX_RETRIES,
+                 timeout=GROQ_TIMEOUT, pool_size=GROQ_POOL_SIZE, name="groq"):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.limiter = limiter or TokenBucketLimiter(
+            GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE, GROQ_RATE_LIMIT_DB, name
+        )
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def _post(self, payload, tokens):
+        """POST with retries; returns an open 200 response or raises GroqAPIError.
+
+        Each attempt takes a request and its tokens from the limiter. A failed
+        attempt gives the tokens back, so a run of 429s or 5xx errors does not
+        drain the token bucket several times over.
+        """
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            with span("groq_queue"):
+                await self.limiter.acquire_async(tokens)
+            response = None
+            try:
+                with span("groq_request"):
+                    request = self.client.build_request("POST", self.endpoint, headers=self._headers(), json=payload)
+                    response = await self.client.send(request, stream=True)
+            except httpx.HTTPError as e:
+                UPSTREAM_RESPONSES.labels(self.name, "connection_error").inc()
+                last_error = GroqAPIError(None, f"Groq API request failed: {str(e)}")
+                logger.warning(f"{self.name} request failed (attempt {attempt + 1}): {str(e)}")
+            else:
+                UPSTREAM_RESPONSES.labels(self.name, str(response.status_code)).inc()
+                if response.status_code == 200:
+                    return response
+                try:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                except httpx.HTTPError:
+                    body = ""
+                finally:
+                    await response.aclose()
+                last_error = GroqAPIError(response.status_code, f"Groq API error: {response.status_code}")
+                logger.warning(f"{self.name} API error (attempt {attempt + 1}): {response.status_code} - {body[:500]}")
+
+            # The rejected attempt used none of its tokens
+            await self.limiter.adjust_async(tokens, 0)
+            if last_error.status_code is not None and last_error.status_code not in RETRY_STATUS_CODES:
+                raise last_error
+
+            if attempt < self.max_retries:
+                delay = backoff_delay(attempt, response)
+                logger.info(f"Retrying {self.name} request in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        raise last_error
+
+    async def chat(self, payload, tokens=None, on_delta=None):
+        """Send a chat-completions request and return the decoded JSON body.
+
+        With ``on_delta`` the response is streamed: each content delta is
+        passed to it as it arrives, and the returned body is assembled from
+        them. An error after the first delta is not retried.
+        """
+        if on_delta is not None:
+            payload = dict(payload, stream=True)
+        if tokens is None:
+            tokens = estimate_request_tokens(payload)
+
+        response = await self._post(payload, tokens)
+        try:
+            if on_delta is not None:
+                with span("groq_stream"):
+                    result = await self._read_stream(response, on_delta)
+            else:
+                result = json.loads(await response.aread())
+        except httpx.HTTPError as e:
+            raise GroqAPIError(None, f"Groq API response failed: {str(e)}")
+        except ValueError as e:
+            raise GroqAPIError(response.status_code, f"Groq API sent an invalid response: {str(e)}")
+        finally:
+            await response.aclose()
+
+        usage = result.get("usage") or {}
+        if usage.get("total_tokens") is not None:
+            # Settle the limiter with what the request really cost
+            await self.limiter.adjust_async(tokens, usage["total_tokens"])
+        return result
+
+    async def _read_stream(self, response, on_delta):
+        """Relay the deltas of a streamed response and return it as one chat-completions body."""
+        parts = []
+        usage = finish_reason = None
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # Groq reports usage on the last chunk under x_groq, OpenAI at the top level
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+            if not chunk.get("choices"):
+                continue
+            choice = chunk["choices"][0]
+            finish_reason = choice.get("finish_reason") or finish_reason
+            delta = choice.get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "".join(parts)}, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,94 @@
+import difflib
+import os
+
+from token_budget import count_tokens
+
+# Share of a chapter's tokens that may change before its previous summary is
+# no longer reused as is, and before it is re-summarized from scratch
+RESUMMARIZE_REUSE_RATIO = float(os.getenv("RESUMMARIZE_REUSE_RATIO", 0.02))
+RESUMMARIZE_PARTIAL_RATIO = float(os.getenv("RESUMMARIZE_PARTIAL_RATIO", 0.3))
+
+
+def paragraphs(text):
+    """Split cleaned chapter text into its non-empty paragraphs."""
+    return [paragraph.strip() for paragraph in text.split('\n') if paragraph.strip()]
+
+
+def format_revision(summary, edits):
+    """Prompt text for updating summary with the given ``(before, after)`` paragraph edits."""
+    blocks = []
+    for number, (before, after) in enumerate(edits, 1):
+        before = '\n'.join(before) or '(nothing)'
+        after = '\n'.join(after) or '(removed)'
+        blocks.append(f"Edit {number}\nBefore:\n{before}\nAfter:\n{after}")
+    return f"Current Summary:\n{summary}\n\nEdited Passages:\n" + "\n\n".join(blocks)
+
+
+class UpdatePlan:
+    """How to summarize a re-scraped chapter, given the version its stored summary was made from.
+
+    ``path`` is ``"reuse"`` (keep the previous summary), ``"partial"`` (send
+    the previous summary and the edited passages, in ``revision``) or
+    ``"full"``.
+    """
+
+    def __init__(self, path, changed_paragraphs=0, changed_tokens=0, total_tokens=0, revision=None):
+        self.path = path
+        self.changed_paragraphs = changed_paragraphs
+        self.changed_tokens = changed_tokens
+        self.total_tokens = total_tokens
+        self.revision = revision
+        if path == "reuse":
+            self.tokens_saved = total_tokens
+        elif path == "partial":
+            self.tokens_saved = max(total_tokens - count_tokens(revision), 0)
+        else:
+            self.tokens_saved = 0
+
+    @property
+    def changed_ratio(self):
+        return min(self.changed_tokens / self.total_tokens, 1.0) if self.total_tokens else 1.0
+
+    def report(self):
+        return {
+            "path": self.path,
+            "changed_paragraphs": self.changed_paragraphs,
+            "changed_ratio": round(self.changed_ratio, 4),
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+def plan_update(previous, text, max_input_tokens):
+    """Diff text against ``previous`` = ``(paragraphs, summary)`` or None, and pick a path.
+
+    The change is measured in tokens over the paragraphs difflib marks as
+    inserted, deleted or replaced, counting the larger side of each edit.
+    A partial update also needs its prompt to fit in max_input_tokens and be
+    shorter than the chapter.
+    """
+    current = paragraphs(text)
+    total_tokens = sum(count_tokens(paragraph) for paragraph in current)
+    if previous is None:
+        return UpdatePlan("full", len(current), total_tokens, total_tokens)
+
+    old, summary = previous
+    edits = []
+    changed_paragraphs = changed_tokens = 0
+    matcher = difflib.SequenceMatcher(None, old, current, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        before, after = old[i1:i2], current[j1:j2]
+        edits.append((before, after))
+        changed_paragraphs += max(len(before), len(after))
+        changed_tokens += max(sum(map(count_tokens, before)), sum(map(count_tokens, after)))
+
+    plan = UpdatePlan("full", changed_paragraphs, changed_tokens, total_tokens)
+    if plan.changed_ratio <= RESUMMARIZE_REUSE_RATIO:
+        return UpdatePlan("reuse", changed_paragraphs, changed_tokens, total_tokens)
+    if plan.changed_ratio <= RESUMMARIZE_PARTIAL_RATIO:
+        revision = format_revision(summary, edits)
+        # Only worth it when the summary and edits are smaller than the chapter
+        if count_tokens(revision) <= min(max_input_tokens, total_tokens):
+            return UpdatePlan("partial", changed_paragraphs, changed_tokens, total_tokens, revision)
+    return plan
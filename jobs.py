@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Job queue configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 32))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 3600))
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum of unfinished jobs."""
+
+
+class Job:
+    """A unit of background work and its status, as reported to clients."""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._listeners = []
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def set_stage(self, stage):
+        logger.info(f"Job {self.id}: {stage}")
+        self.stage = stage
+
+    def publish(self, event, data):
+        """Pass an event to the streams following this job, and keep it for those that join later."""
+        self.events.append((event, data))
+        for listener in self._listeners:
+            listener.put_nowait((event, data))
+
+    def subscribe(self):
+        """Return an asyncio.Queue of the job's events so far and to come, ending with None.
+
+        Only for jobs started with submit_async(), from the loop running them.
+        """
+        listener = asyncio.Queue()
+        for item in self.events:
+            listener.put_nowait(item)
+        if self.finished:
+            listener.put_nowait(None)
+        else:
+            self._listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _close_events(self):
+        for listener in self._listeners:
+            listener.put_nowait(None)
+        # The result has everything the events did, so late subscribers go straight to it
+        self._listeners = []
+        self.events = []
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """Bounded in-process job queue with coalescing of duplicate keys.
+
+    ``fn(job, *args)`` must return ``(result, error)``. Submitting a key that
+    already has an unfinished job returns that job instead of a new one.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self._jobs = {}
+        self._in_flight = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """Queue ``fn`` for key and return ``(job, created)``."""
+        job, created = self._register(key)
+        if created:
+            self._executor.submit(self._run, job, fn, args)
+            logger.info(f"Queued job {job.id} for {key}")
+        return job, created
+
+    def submit_async(self, key, fn, *args):
+        """Like submit(), but runs the coroutine ``fn(job, *args)`` as a task on the running loop."""
+        job, created = self._register(key)
+        if created:
+            task = asyncio.get_running_loop().create_task(self._run_async(job, fn, args))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            logger.info(f"Started job {job.id} for {key}")
+        return job, created
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def depth(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def _register(self, key):
+        with self._lock:
+            self._purge_expired()
+
+            job_id = self._in_flight.get(key)
+            if job_id is not None:
+                logger.info(f"Coalescing request for {key} into job {job_id}")
+                return self._jobs[job_id], False
+
+            if len(self._in_flight) >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job.id
+        return job, True
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        try:
+            result, error = fn(job, *args)
+        except Exception as e:
+            logger.exception(f"Job {job.id} raised: {str(e)}")
+            result, error = None, f"An unexpected error occurred: {str(e)}"
+        self._finish(job, result, error)
+
+    async def _run_async(self, job, fn, args):
+        job.status = "running"
+        try:
+            result, error = await fn(job, *args)
+        except Exception as e:
+            logger.exception(f"Job {job.id} raised: {str(e)}")
+            result, error = None, f"An unexpected error occurred: {str(e)}"
+        self._finish(job, result, error)
+
+    def _finish(self, job, result, error):
+        job.result = result
+        job.error = error
+        job.status = "failed" if error else "done"
+        job.finished_at = time.time()
+        job._close_events()
+        logger.info(f"Job {job.id} {job.status} in {job.finished_at - job.created_at:.1f}s")
+
+        with self._lock:
+            if self._in_flight.get(job.key) == job.id:
+                del self._in_flight[job.key]
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from resource_limits import peak_rss_bytes
+
+# Stages run from milliseconds (cache lookups) to minutes (slow pages, long chapters)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "wattpad_stage_seconds", "Time spent in each stage of scraping and summarizing",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+SELECTOR_HITS = Counter(
+    "wattpad_selector_hits_total", "Selector (or API) that supplied a chapter's title or paragraphs",
+    ["kind", "selector"],
+)
+TRUNCATIONS = Counter(
+    "wattpad_truncations_total", "Inputs or outputs cut short to fit a limit", ["kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "wattpad_cache_lookups_total", "Summary and chapter cache lookups by result", ["cache", "result"],
+)
+UPSTREAM_RESPONSES = Counter(
+    "wattpad_upstream_responses_total", "Responses from upstream services by status code", ["service", "code"],
+)
+BACKEND_CALLS = Counter(
+    "wattpad_backend_calls_total", "Summary requests per backend by outcome", ["backend", "result"],
+)
+BACKEND_HEDGES = Counter(
+    "wattpad_backend_hedges_total", "Hedged summary requests, and how many the hedge won", ["result"],
+)
+BACKEND_BREAKER_OPEN = Gauge(
+    "wattpad_backend_breaker_open", "1 while a backend's circuit breaker keeps it out of rotation", ["backend"],
+)
+BROWSER_RSS = Gauge(
+    "wattpad_browser_rss_bytes", "RSS of each pooled browser and its renderers at the last check", ["slot"],
+)
+BROWSER_PEAK_RSS = Gauge(
+    "wattpad_browser_peak_rss_bytes", "Highest RSS seen for each pooled browser and its renderers", ["slot"],
+)
+WORKER_PEAK_RSS = Gauge(
+    "wattpad_worker_peak_rss_bytes", "Peak RSS of this app process, not counting its browsers",
+)
+WORKER_PEAK_RSS.set_function(peak_rss_bytes)
+BROWSER_TEARDOWNS = Counter(
+    "wattpad_browser_teardowns_total", "Pages, contexts and browsers closed early to stay within limits", ["reason"],
+)
+
+# Timing breakdown of the request being handled, when one was asked for
+_timings = ContextVar("timings", default=None)
+
+
+def record(stage, seconds):
+    """Add a finished stage to the stage histogram and the request's breakdown."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0) + seconds * 1000, 1)
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings():
+    """Collect milliseconds per stage for the spans finished inside the block.
+
+    Spans in asyncio tasks, ``asyncio.to_thread`` calls, browser pool tasks and
+    summaries run through ``summarizer.run_sync`` started from the block are
+    included, since they all run in a copy of the current context. Stages
+    that run more than once are summed.
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def render():
+    """Return ``(body, content_type)`` for a Prometheus scrape."""
+    return generate_latest(), CONTENT_TYPE_LATEST
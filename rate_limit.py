@@ -0,0 +1,150 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+
+class RateLimiter:
+    """Spaces out calls so that at most ``per_minute`` start in any minute.
+
+    ``acquire()`` blocks the caller until its turn; calls are admitted in
+    the order they arrive.
+    """
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TokenBucketLimiter:
+    """Token-bucket limiter for a requests-per-minute and tokens-per-minute quota.
+
+    Both buckets refill continuously and ``acquire(tokens)`` blocks until one
+    request and ``tokens`` tokens are available. With ``db_path`` set the
+    bucket state lives in a SQLite file, so every worker process draws from
+    the same quota; otherwise it is kept in memory. Limiters with different
+    ``name``s keep separate buckets in the same file.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, db_path="", name="groq"):
+        self.capacity = (float(requests_per_minute), float(tokens_per_minute))
+        self.db_path = db_path
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = (self.capacity[0], self.capacity[1], time.time())
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS token_buckets ("
+                    "name TEXT PRIMARY KEY, requests REAL NOT NULL, "
+                    "tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO token_buckets (name, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                    (self.name, *self._state),
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _refill(self, state, now):
+        requests, tokens, updated_at = state
+        elapsed = max(now - updated_at, 0.0)
+        requests = min(self.capacity[0], requests + elapsed * self.capacity[0] / 60.0)
+        tokens = min(self.capacity[1], tokens + elapsed * self.capacity[1] / 60.0)
+        return requests, tokens
+
+    def _take(self, state, tokens, now):
+        """Return ``(new_state, wait)``; new_state is None when the caller must wait."""
+        available_requests, available_tokens = self._refill(state, now)
+        # A bucket with no configured limit never holds a request back
+        if self.capacity[0] <= 0:
+            available_requests = 1.0
+        if self.capacity[1] <= 0:
+            tokens = 0
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        tokens = min(float(tokens), self.capacity[1])
+        if available_requests >= 1 and available_tokens >= tokens:
+            return (available_requests - 1, available_tokens - tokens, now), 0.0
+        wait = max(
+            (1 - available_requests) * 60.0 / self.capacity[0] if self.capacity[0] > 0 else 0.0,
+            (tokens - available_tokens) * 60.0 / self.capacity[1] if self.capacity[1] > 0 else 0.0,
+        )
+        return None, max(wait, 0.01)
+
+    def _update(self, change):
+        """Atomically apply ``change(state, now)`` to the bucket and return its result."""
+        now = time.time()
+        if not self.db_path:
+            with self._lock:
+                new_state, result = change(self._state, now)
+                if new_state is not None:
+                    self._state = new_state
+                return result
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = conn.execute(
+                "SELECT requests, tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            new_state, result = change(state, now)
+            if new_state is not None:
+                conn.execute(
+                    "UPDATE token_buckets SET requests = ?, tokens = ?, updated_at = ? WHERE name = ?",
+                    (*new_state, self.name),
+                )
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def acquire(self, tokens=0):
+        """Block until one request and ``tokens`` tokens can be spent, then spend them."""
+        if self.capacity[0] <= 0 and self.capacity[1] <= 0:
+            return
+        while True:
+            wait = self._update(lambda state, now: self._take(state, tokens, now))
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=0):
+        """acquire() for asyncio callers: waits without blocking the event loop."""
+        if self.capacity[0] <= 0 and self.capacity[1] <= 0:
+            return
+        while True:
+            wait = await self._update_async(lambda state, now: self._take(state, tokens, now))
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _update_async(self, change):
+        # The shared SQLite bucket can wait on another worker's lock, so keep it off the loop
+        if self.db_path:
+            return await asyncio.to_thread(self._update, change)
+        return self._update(change)
+
+    def adjust(self, estimated, actual):
+        """Settle a request's estimated token cost against what it actually used."""
+        def settle(state, now):
+            requests, tokens = self._refill(state, now)
+            tokens = min(self.capacity[1], tokens + estimated - actual)
+            return (requests, tokens, now), None
+        self._update(settle)
+
+    async def adjust_async(self, estimated, actual):
+        if self.db_path:
+            await asyncio.to_thread(self.adjust, estimated, actual)
+        else:
+            self.adjust(estimated, actual)
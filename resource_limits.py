@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the cross-process page cap is skipped there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Browser pages open at once across every app process on the machine; 0 disables the cap
+BROWSER_GLOBAL_PAGES = int(os.getenv("BROWSER_GLOBAL_PAGES", 8))
+BROWSER_LOCK_DIR = os.getenv("BROWSER_LOCK_DIR", os.path.join(tempfile.gettempdir(), "wattpad-page-slots"))
+# Chromium's disk cache and downloads go here instead of the profile in the system temp dir
+BROWSER_TEMP_DIR = os.getenv("BROWSER_TEMP_DIR", os.path.join(tempfile.gettempdir(), "wattpad-chromium"))
+
+
+class PageSlots:
+    """Cross-process cap on open browser pages.
+
+    Each slot is a lock file in ``lock_dir`` that a page holds with
+    ``flock()`` while it is open. The kernel releases the locks of a process
+    that exits, so a crashed worker never leaks slots. A ``limit`` of 0 means
+    no cap.
+    """
+
+    def __init__(self, limit=BROWSER_GLOBAL_PAGES, lock_dir=BROWSER_LOCK_DIR, poll_interval=0.05):
+        self.limit = limit if fcntl is not None else 0
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self._files = []
+        # flock() locks belong to the open file, so slots held in this process are tracked here
+        self._held = set()
+        self._lock = threading.Lock()
+        if limit > 0 and fcntl is None:
+            logger.warning("fcntl is unavailable, browser pages are not capped across processes")
+
+    def _open(self):
+        if not self._files:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._files = [open(os.path.join(self.lock_dir, f"slot-{index}.lock"), "a+")
+                           for index in range(self.limit)]
+
+    def try_acquire(self):
+        """Take a free slot; returns its index, or None if all are taken."""
+        with self._lock:
+            self._open()
+            # Start at a different slot in each process so they do not all contend for slot 0
+            start = os.getpid() % self.limit
+            for offset in range(self.limit):
+                index = (start + offset) % self.limit
+                if index in self._held:
+                    continue
+                try:
+                    fcntl.flock(self._files[index], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(index)
+                return index
+        return None
+
+    async def acquire(self):
+        """Wait for a free slot and return its index (None when there is no cap)."""
+        if self.limit <= 0:
+            return None
+        while True:
+            index = self.try_acquire()
+            if index is not None:
+                return index
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self, index):
+        if index is None:
+            return
+        with self._lock:
+            fcntl.flock(self._files[index], fcntl.LOCK_UN)
+            self._held.discard(index)
+
+
+def _read_processes():
+    """Return ``({pid: (ppid, cmdline, rss_bytes)}, {ppid: [pid]})`` from /proc; empty off Linux."""
+    processes, children = {}, {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return processes, children
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/statm") as file:
+                rss = int(file.read().split()[1]) * page_size
+            with open(f"/proc/{entry}/cmdline", "rb") as file:
+                cmdline = file.read().replace(b"\0", b" ").decode(errors="replace")
+        except (OSError, ValueError, IndexError):
+            continue
+        processes[int(entry)] = (ppid, cmdline, rss)
+        children.setdefault(ppid, []).append(int(entry))
+    return processes, children
+
+
+def browser_rss_bytes(marker):
+    """Total RSS of the Chromium launched with ``marker`` in its arguments and all its child processes.
+
+    Returns 0 if the browser is not found.
+    """
+    processes, children = _read_processes()
+    roots = [pid for pid, (_, cmdline, _) in processes.items() if marker in cmdline and "--type=" not in cmdline]
+    total, stack = 0, roots
+    while stack:
+        pid = stack.pop()
+        total += processes[pid][2]
+        stack.extend(child for child in children.get(pid, []) if child in processes)
+    return total
+
+
+def peak_rss_bytes():
+    """Peak RSS of this process (VmHWM), or 0 off Linux."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def browser_temp_dir(base=BROWSER_TEMP_DIR):
+    """Create a temp dir for one browser, removing those left behind by processes that have exited."""
+    os.makedirs(base, exist_ok=True)
+    for name in os.listdir(base):
+        pid = name.split("-", 1)[0]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+    return tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=base)
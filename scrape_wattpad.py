@@ -1,5 +1,10 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from bs4 import BeautifulSoup
+from urllib.parse import urlsplit
+import argparse
+import asyncio
 import re
+import shutil
 import sys
 import json
 import os
@@ -7,6 +12,9 @@ import logging
 import time
 import traceback
 
+from metrics import SELECTOR_HITS, UPSTREAM_RESPONSES, collect_timings, span
+from resource_limits import browser_temp_dir
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,188 +24,707 @@ logger = logging.getLogger(__name__)
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Ensure the folder exists
 
+# Request interception: resource types and third-party hosts the text never depends on
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1") == "1"
+BLOCKED_RESOURCE_TYPES = os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font,stylesheet")
+BLOCKED_DOMAINS = os.getenv("BLOCKED_DOMAINS", ",".join([
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "facebook.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "moatads.com",
+    "chartbeat.com",
+    "hotjar.com",
+    "branch.io",
+]))
+# Hosts or URL substrings that are always let through
+BLOCK_ALLOWLIST = os.getenv("BLOCK_ALLOWLIST", "")
+
+def _split_setting(value):
+    return {item.strip().lower() for item in value.split(",") if item.strip()}
+
+class ResourceBlocker:
+    """Aborts page requests that text extraction does not need.
+
+    Blocks the configured resource types and any request to a blocked
+    domain (or its subdomains), unless the URL matches the allowlist. Keeps
+    per-page counts of what was blocked and how many bytes were loaded.
+    """
+
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, blocked_domains=BLOCKED_DOMAINS,
+                 allowlist=BLOCK_ALLOWLIST):
+        self.resource_types = _split_setting(resource_types)
+        self.blocked_domains = _split_setting(blocked_domains)
+        self.allowlist = _split_setting(allowlist)
+        self.blocked_by_type = {}
+        self.requests_allowed = 0
+        self.bytes_loaded = 0
+
+    async def install(self, page):
+        await page.route("**/*", self._handle_route)
+        page.on("requestfinished", self._on_request_finished)
+
+    def should_block(self, url, resource_type):
+        lowered = url.lower()
+        if any(allowed in lowered for allowed in self.allowlist):
+            return False
+        if resource_type in self.resource_types:
+            return True
+        host = (urlsplit(lowered).hostname or "")
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            await route.abort()
+        else:
+            self.requests_allowed += 1
+            await route.continue_()
+
+    async def _on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+            self.bytes_loaded += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            # The page may already be closing; sizes are best effort
+            pass
+
+    def stats(self):
+        return {
+            "requests_blocked": sum(self.blocked_by_type.values()),
+            "blocked_by_type": dict(self.blocked_by_type),
+            "requests_allowed": self.requests_allowed,
+            "bytes_loaded": self.bytes_loaded,
+        }
+
 def sanitize_filename(title):
     """Remove invalid filename characters and trim excessive spaces."""
     sanitized = re.sub(r'[\\/:*?"<>|]', '', title).strip()
     return sanitized[:50]  # Limit filename length to avoid issues
 
-def run(playwright, chapter_link):
-    browser = None
-    context = None
-    
-    try:
-        logger.info(f"Starting scraping for URL: {chapter_link}")
-        browser = playwright.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 800})
-        page = context.new_page()
-        page.set_default_timeout(60000)  # 60 seconds timeout - reduced from 120
-
-        if not chapter_link:
-            logger.error("No URL provided")
-            print(json.dumps({"error": "No URL provided!"}))
-            return
+# Site accepted as Wattpad; the benchmarks point it at a local stub server
+WATTPAD_DOMAIN = os.getenv("WATTPAD_DOMAIN", "wattpad.com")
+
+# Wattpad API endpoints, relative to the site origin
+STORY_PARTS_API = "/api/v3/stories/{story_id}?fields=title,parts(id,title,url)"
+PART_INFO_API = "/api/v3/story_parts/{part_id}?fields=id,title,pages,modifyDate"
+STORY_TEXT_API = "/apiv2/storytext?id={part_id}&page={page}"
+
+# Selectors tried in order for the chapter title and its paragraphs
+TITLE_SELECTORS = [
+    'h1',
+    'h1.h5',
+    'h2.font-semibold',
+    'h1[data-part-title]',
+    '.story-parts-title h1',
+    '.story-info__title',
+    '.part-title',
+    '.part-header__title'
+]
+PARAGRAPH_SELECTORS = [
+    'pre p',
+    '.page-content p',
+    '.story-parts__part p',
+    '.page-read p',
+    '.reader-text p',
+    '[data-page-number] p',
+    '[role="article"] p',
+    '.panel-reading p'
+]
+
+# Runs the title and paragraph selector cascades inside the page and returns
+# everything in one payload. Cleanup matches clean_paragraph(): trailing '+'
+# is dropped, a selector wins with more than 5 paragraphs, and the generic
+# fallback only keeps paragraphs longer than 20 characters.
+EXTRACT_SCRIPT = """({titleSelectors, paragraphSelectors}) => {
+    const errors = [];
+    const clean = (text) => {
+        let content = text.trim();
+        if (content.endsWith('+')) content = content.slice(0, -1).trim();
+        return content;
+    };
+
+    let title = null;
+    let titleSelector = null;
+    for (const selector of titleSelectors) {
+        try {
+            const element = document.querySelector(selector);
+            const candidate = element ? (element.textContent || '').trim() : '';
+            if (candidate && candidate.toLowerCase() !== 'browse' && candidate.length > 3) {
+                title = candidate;
+                titleSelector = selector;
+                break;
+            }
+        } catch (e) {
+            errors.push([selector, String(e)]);
+        }
+    }
+
+    let paragraphs = [];
+    let paragraphSelector = null;
+    for (const selector of paragraphSelectors) {
+        try {
+            const found = [];
+            for (const element of document.querySelectorAll(selector)) {
+                const content = (element.textContent || '').trim();
+                if (content) found.push(clean(content));
+            }
+            if (found.length > 5) {
+                paragraphs = found;
+                paragraphSelector = selector;
+                break;
+            }
+        } catch (e) {
+            errors.push([selector, String(e)]);
+        }
+    }
+
+    if (!paragraphs.length) {
+        for (const element of document.querySelectorAll('p, .p')) {
+            const content = (element.textContent || '').trim();
+            if (content.length > 20) paragraphs.push(clean(content));
+        }
+    }
+
+    return {title, titleSelector, paragraphs, paragraphSelector, errors};
+}"""
+
+# Adaptive content wait: the page is done once the paragraph count has been
+# stable for CONTENT_QUIET_MS and its chapter-text requests have finished.
+# Pages without any paragraphs (error pages, empty shells) only need their
+# height to stay stable, for the longer CONTENT_EMPTY_QUIET_MS.
+CONTENT_QUIET_MS = int(os.getenv("CONTENT_QUIET_MS", 500))
+CONTENT_EMPTY_QUIET_MS = int(os.getenv("CONTENT_EMPTY_QUIET_MS", 2000))
+CONTENT_WAIT_DEADLINE_MS = int(os.getenv("CONTENT_WAIT_DEADLINE_MS", 10000))
+# Minimum time the old fixed-sleep scroll loop spent waiting (3000 + 500 + 1000 ms)
+FIXED_DELAY_FLOOR_MS = 4500
+
+# Resolves once the paragraph counts and page height stop changing. A
+# MutationObserver re-checks on every DOM change and scrolls to the bottom
+# whenever the page grew, so lazy-loaded pages keep loading. The wait ends
+# as 'stable' with chapter paragraphs, 'stable-generic' with only the plain
+# `p, .p` ones the fallback extraction reads, and 'stable-empty' with neither.
+WAIT_FOR_CONTENT_SCRIPT = """({selector, quietMs, emptyQuietMs, deadlineMs}) => new Promise(resolve => {
+    const started = performance.now();
+    let lastCount = -1;
+    let lastGeneric = -1;
+    let lastHeight = -1;
+    let scrolls = 0;
+    let quietTimer = null;
+    let observer = null;
+    let deadlineTimer = null;
+    const count = () => document.querySelectorAll(selector).length;
+    const countGeneric = () => document.querySelectorAll('p, .p').length;
+    const finish = (reason) => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(deadlineTimer);
+        resolve({reason, paragraphs: count(), scrolls, waitedMs: Math.round(performance.now() - started)});
+    };
+    const check = () => {
+        const paragraphs = count();
+        const generic = countGeneric();
+        const height = document.body.scrollHeight;
+        if (paragraphs === lastCount && generic === lastGeneric && height === lastHeight) return;
+        lastCount = paragraphs;
+        lastGeneric = generic;
+        lastHeight = height;
+        window.scrollTo(0, height);
+        scrolls += 1;
+        clearTimeout(quietTimer);
+        if (paragraphs > 0) quietTimer = setTimeout(() => finish('stable'), quietMs);
+        else if (generic > 0) quietTimer = setTimeout(() => finish('stable-generic'), quietMs);
+        else quietTimer = setTimeout(() => finish('stable-empty'), emptyQuietMs);
+    };
+    observer = new MutationObserver(check);
+    observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    deadlineTimer = setTimeout(() => finish('deadline'), deadlineMs);
+    check();
+})"""
+
+# Path of the API the reader page loads chapter text from
+STORY_TEXT_PATH = urlsplit(STORY_TEXT_API).path
+
+def is_text_request(url):
+    """Whether url fetches chapter text: /apiv2/storytext, or /apiv2/?m=storytext."""
+    parts = urlsplit(url)
+    if parts.path.rstrip("/") == STORY_TEXT_PATH:
+        return True
+    return parts.path.startswith("/apiv2") and "m=storytext" in parts.query
+
+class InFlightRequests:
+    """Tracks a page's in-flight chapter-text requests to the site being scraped.
+
+    Other XHR/fetch traffic (analytics, comments, ads) is ignored, since a
+    long-lived request there would hold the content wait to its deadline.
+    """
+
+    def __init__(self, site_host):
+        # Match the registrable part so www. and api. hosts both count
+        self.site = ".".join((site_host or "").split(".")[-2:])
+        self.pending = set()
+        self.idle = asyncio.Event()
+        self.idle.set()
 
-        if not chapter_link.startswith(('http://', 'https://')):
-            chapter_link = 'https://' + chapter_link
-        
-        if 'wattpad.com' not in chapter_link:
-            logger.error("Not a Wattpad URL")
-            print(json.dumps({"error": "Please enter a valid Wattpad URL"}))
+    def install(self, page):
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, request):
+        if request.resource_type not in ("xhr", "fetch"):
             return
+        host = urlsplit(request.url).hostname or ""
+        if (host == self.site or host.endswith("." + self.site)) and is_text_request(request.url):
+            self.pending.add(request)
+            self.idle.clear()
+
+    def _on_done(self, request):
+        self.pending.discard(request)
+        if not self.pending:
+            self.idle.set()
+
+async def wait_for_content(page, text_requests):
+    """Wait until the chapter text has finished loading, up to a hard deadline.
+
+    Returns how long was spent waiting and why it stopped.
+    """
+    started = time.monotonic()
+    deadline = started + CONTENT_WAIT_DEADLINE_MS / 1000
+    selector = ", ".join(PARAGRAPH_SELECTORS)
+    scrolls = 0
+    result = {"reason": "deadline", "paragraphs": 0}
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            result["reason"] = "deadline"
+            break
+        try:
+            result = await page.evaluate(WAIT_FOR_CONTENT_SCRIPT, {
+                "selector": selector,
+                "quietMs": CONTENT_QUIET_MS,
+                "emptyQuietMs": CONTENT_EMPTY_QUIET_MS,
+                "deadlineMs": remaining * 1000
+            })
+        except Exception as e:
+            # A client-side navigation destroys the execution context; extract what is there
+            logger.warning(f"Content wait interrupted: {str(e)}")
+            result = {"reason": "interrupted", "paragraphs": 0, "scrolls": 0}
+            break
+        scrolls += result["scrolls"]
+        if not result["reason"].startswith("stable") or text_requests.idle.is_set():
+            break
+        # The DOM went quiet but text requests are still loading; check again once they land
+        try:
+            await asyncio.wait_for(text_requests.idle.wait(), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            result["reason"] = "deadline"
+            break
+
+    return {
+        "wait_ms": round((time.monotonic() - started) * 1000),
+        "wait_reason": result["reason"],
+        "scrolls": scrolls,
+        "paragraphs_seen": result["paragraphs"],
+    }
+
+# Fetch chapter text straight from the API before falling back to rendering the page
+API_FAST_PATH = os.getenv("API_FAST_PATH", "1") == "1"
+# Upper bound on text pages requested when the part metadata has no page count
+MAX_STORY_TEXT_PAGES = 50
+
+# Collects the story title and part links from a story page's table of contents
+TABLE_OF_CONTENTS_SCRIPT = """() => {
+    const seen = new Set();
+    const parts = [];
+    const links = document.querySelectorAll(
+        '[data-testid="toc"] a, .table-of-contents a, .story-parts a, .toc-part a'
+    );
+    for (const link of links) {
+        if (!link.href || seen.has(link.href)) continue;
+        seen.add(link.href);
+        parts.push({title: link.textContent.trim(), url: link.href});
+    }
+    const heading = document.querySelector('h1, .story-info__title');
+    return {title: heading ? heading.textContent.trim() : 'Untitled Story', parts: parts};
+}"""
+
+# Launch Chromium with flags that trade speed we do not need (GPU, extra renderers) for memory
+CHROMIUM_LOW_MEMORY = os.getenv("CHROMIUM_LOW_MEMORY", "1") == "1"
+CHROMIUM_RENDERER_LIMIT = int(os.getenv("CHROMIUM_RENDERER_LIMIT", 2))
+CHROMIUM_JS_HEAP_MB = int(os.getenv("CHROMIUM_JS_HEAP_MB", 256))
+CHROMIUM_EXTRA_ARGS = os.getenv("CHROMIUM_EXTRA_ARGS", "")
+
+LOW_MEMORY_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=site-per-process,Translate,MediaRouter",
+    "--disable-gpu-shader-disk-cache",
+    "--disk-cache-size=1",
+    "--media-cache-size=1",
+    "--mute-audio",
+]
+
+def chromium_args(temp_dir):
+    """Command-line flags for a scraping browser whose caches live in temp_dir."""
+    args = [f"--disk-cache-dir={os.path.join(temp_dir, 'cache')}"]
+    if CHROMIUM_LOW_MEMORY:
+        args += LOW_MEMORY_ARGS + [
+            f"--renderer-process-limit={CHROMIUM_RENDERER_LIMIT}",
+            f"--js-flags=--max-old-space-size={CHROMIUM_JS_HEAP_MB}",
+        ]
+    return args + CHROMIUM_EXTRA_ARGS.split()
+
+async def launch_browser(playwright, temp_dir=None):
+    """Launch the headless Chromium used for scraping.
+
+    Its disk cache and downloads go to temp_dir (a fresh one by default),
+    which is removed when the browser closes or crashes.
+    """
+    temp_dir = temp_dir or browser_temp_dir()
+    try:
+        browser = await playwright.chromium.launch(
+            headless=True, args=chromium_args(temp_dir), downloads_path=os.path.join(temp_dir, "downloads")
+        )
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    browser.on("disconnected", lambda _: shutil.rmtree(temp_dir, ignore_errors=True))
+    return browser
+
+async def new_context(browser):
+    """Create a browser context with the viewport the selectors were tuned for."""
+    return await browser.new_context(viewport={"width": 1280, "height": 800})
+
+def clean_paragraph(content):
+    """Apply the scraper's paragraph cleanup rules; returns '' for empty paragraphs."""
+    content = content.strip()
+    # Remove '+' at the end of paragraphs if present
+    if content.endswith('+'):
+        content = content[:-1].strip()
+    return content
+
+def parse_story_text(html):
+    """Split story-text HTML from the API into cleaned paragraphs."""
+    soup = BeautifulSoup(html, "html.parser")
+    elements = soup.find_all("p")
+    texts = [p.get_text() for p in elements] if elements else soup.get_text().split("\n")
+    return [paragraph for paragraph in map(clean_paragraph, texts) if paragraph]
+
+def part_id_from_url(chapter_link):
+    """Return the numeric part ID at the start of a Wattpad part URL, or None."""
+    path = urlsplit(chapter_link).path
+    match = re.match(r'/(\d+)(?:-|/|$)', path)
+    return match.group(1) if match else None
+
+async def fetch_chapter_from_api(page, chapter_link):
+    """Fast path: fetch a part's title and text from the Wattpad API.
+
+    Uses the page's request context (sharing its cookies) without rendering
+    or scrolling anything. Returns ``{"title", "paragraphs"}`` or None when
+    the API cannot serve this part, in which case the caller renders the page.
+    """
+    part_id = part_id_from_url(chapter_link)
+    if not part_id:
+        return None
+
+    origin = "{0.scheme}://{0.netloc}".format(urlsplit(chapter_link))
+    try:
+        response = await page.request.get(origin + PART_INFO_API.format(part_id=part_id))
+        UPSTREAM_RESPONSES.labels("wattpad_api", str(response.status)).inc()
+        if not response.ok:
+            logger.info(f"Part API returned {response.status}, falling back to page render")
+            return None
+        info = await response.json()
+        known_pages = info.get("pages")
+
+        paragraphs = []
+        for page_number in range(1, (known_pages or MAX_STORY_TEXT_PAGES) + 1):
+            response = await page.request.get(origin + STORY_TEXT_API.format(part_id=part_id, page=page_number))
+            UPSTREAM_RESPONSES.labels("wattpad_api", str(response.status)).inc()
+            # A missing page would store a truncated chapter as if it were whole
+            if not response.ok:
+                logger.info(f"Text page {page_number} returned {response.status}, falling back to page render")
+                return None
+            page_paragraphs = parse_story_text(await response.text())
+            if not page_paragraphs:
+                # Without a page count, the first empty page is the end of the part
+                if known_pages:
+                    logger.info(f"Text page {page_number} of {known_pages} was empty, falling back to page render")
+                    return None
+                break
+            paragraphs.extend(page_paragraphs)
+    except Exception as e:
+        logger.warning(f"API fast path failed: {str(e)}, falling back to page render")
+        return None
+
+    if not paragraphs:
+        logger.info("API returned no text, falling back to page render")
+        return None
+
+    logger.info(f"Fetched {len(paragraphs)} paragraphs from the API")
+    return {
+        "title": info.get("title") or "Untitled Chapter",
+        "paragraphs": paragraphs,
+        "modified": info.get("modifyDate")
+    }
+
+def normalize_url(link):
+    """Return ``(url, error)`` for a user-supplied Wattpad link."""
+    if not link:
+        logger.error("No URL provided")
+        return None, "No URL provided!"
 
-        logger.info(f"Navigating to: {chapter_link}")
+    if not link.startswith(('http://', 'https://')):
+        link = 'https://' + link
+
+    if WATTPAD_DOMAIN not in link:
+        logger.error("Not a Wattpad URL")
+        return None, "Please enter a valid Wattpad URL"
+
+    return link, None
+
+async def scrape_chapter(page, chapter_link, on_progress=None):
+    """Scrape a Wattpad chapter with an already open page.
+
+    Returns a dict with the chapter ``title``, ``text`` and page load
+    ``stats``, or a dict with an ``error`` message when the URL is invalid
+    or no content could be found. Chapters read from the API also carry the
+    part's ``modified`` stamp.
+    ``on_progress`` is called with the name of each phase as it starts:
+    ``navigate``, ``scroll`` and ``extract``.
+    """
+    def report(stage):
+        if on_progress:
+            on_progress(stage)
+
+    page.set_default_timeout(60000)  # 60 seconds timeout - reduced from 120
+
+    chapter_link, error = normalize_url(chapter_link)
+    if error:
+        return {"error": error}
+
+    report("navigate")
+    started = time.monotonic()
+
+    if API_FAST_PATH:
+        with span("api_fetch"):
+            chapter = await fetch_chapter_from_api(page, chapter_link)
+        if chapter:
+            SELECTOR_HITS.labels("title", "api").inc()
+            SELECTOR_HITS.labels("paragraphs", "api").inc()
+            report("extract")
+            stats = {"page_ms": round((time.monotonic() - started) * 1000), "source": "api"}
+            logger.info(f"Page stats: {stats}")
+            return {
+                "title": chapter["title"],
+                "text": "\n".join(chapter["paragraphs"]),
+                "modified": chapter["modified"],
+                "stats": stats
+            }
+
+    blocker = None
+    if BLOCK_RESOURCES:
+        blocker = ResourceBlocker()
+        await blocker.install(page)
+
+    # Track the page's chapter-text requests so the content wait can tell when they are done
+    text_requests = InFlightRequests(urlsplit(chapter_link).hostname)
+    text_requests.install(page)
+
+    logger.info(f"Navigating to: {chapter_link}")
+    with span("navigate"):
         try:
             # Attempt to navigate with a shorter timeout first
-            page.goto(chapter_link, timeout=30000, wait_until="domcontentloaded")
+            await page.goto(chapter_link, timeout=30000, wait_until="domcontentloaded")
             logger.info("Page loaded (domcontentloaded)")
         except Exception as e:
             logger.warning(f"Initial page load failed: {str(e)}, trying with longer timeout")
             # If that fails, try again with a different wait strategy
-            page.goto(chapter_link, timeout=45000, wait_until="load")
+            await page.goto(chapter_link, timeout=45000, wait_until="load")
             logger.info("Page loaded (load event)")
-        
-        # Wait a bit for any JavaScript to initialize
-        page.wait_for_timeout(3000)
-        logger.info("Waited for page initialization")
-        
-        # Try multiple selectors for title elements
-        title_selectors = [
-            'h1',
-            'h1.h5',
-            'h2.font-semibold',
-            'h1[data-part-title]',
-            '.story-parts-title h1',
-            '.story-info__title',
-            '.part-title',
-            '.part-header__title'
-        ]
-        
-        chapter_title = "Untitled Chapter"
-        for selector in title_selectors:
-            try:
-                logger.info(f"Trying title selector: {selector}")
-                title_element = page.query_selector(selector)
-                if title_element:
-                    potential_title = title_element.text_content().strip()
-                    if potential_title and potential_title.lower() != "browse" and len(potential_title) > 3:
-                        chapter_title = potential_title
-                        logger.info(f"Found title with selector {selector}: {chapter_title}")
-                        break
-            except Exception as e:
-                logger.warning(f"Error with title selector {selector}: {str(e)}")
-        
-        safe_title = sanitize_filename(chapter_title)
-        logger.info(f"Using chapter title: {chapter_title}")
-        
-        # Scroll down the page to ensure all content is loaded
-        logger.info("Scrolling through page to load all content...")
-        
-        # Get the initial height of the page
-        initial_height = page.evaluate('document.body.scrollHeight')
-        
-        # Scroll down in increments to trigger content loading
-        last_height = 0
-        current_height = initial_height
-        max_scroll_attempts = 15  # Reduced from 30 to prevent too much time spent scrolling
-        scroll_count = 0
-        
-        for _ in range(max_scroll_attempts):
-            scroll_count += 1
-            # Scroll to the bottom of the currently loaded content
-            page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
-            
-            # Wait for any new content to load
-            page.wait_for_timeout(500)  # Reduced from 1000ms to 500ms
-            
-            # Check if we've reached the end (if the height hasn't changed)
-            last_height = current_height
-            current_height = page.evaluate('document.body.scrollHeight')
-            
-            logger.info(f"Scroll {scroll_count}: height {current_height} (change: {current_height - last_height})")
-            
-            if current_height == last_height:
-                # If height hasn't changed, wait one more time and check again
-                page.wait_for_timeout(1000)
-                new_height = page.evaluate('document.body.scrollHeight')
-                if new_height == current_height:
-                    logger.info("No height change after waiting, ending scroll")
-                    break
-                current_height = new_height
-        
-        logger.info(f"Scrolling complete. Page height changed from {initial_height} to {current_height}")
-        
-        # Try different selectors for paragraph content
-        paragraph_selector_options = [
-            'pre >> p',
-            '.page-content p',
-            '.story-parts__part p',
-            '.page-read p',
-            '.reader-text p',
-            '[data-page-number] p',
-            '[role="article"] p',
-            '.panel-reading p'
-        ]
-        
-        paragraphs = []
-        for selector in paragraph_selector_options:
-            logger.info(f"Trying paragraph selector: {selector}")
-            try:
-                paragraph_elements = page.query_selector_all(selector)
-                
-                # Process paragraphs from this selector
-                selector_paragraphs = []
-                for p in paragraph_elements:
-                    content = p.text_content().strip()
-                    if content:
-                        # Remove '+' at the end of paragraphs if present
-                        if content.endswith('+'):
-                            content = content[:-1].strip()
-                        selector_paragraphs.append(content)
-                
-                # If we found a good number of paragraphs, use this selector's results
-                if len(selector_paragraphs) > 5:  # Assuming a chapter has at least 5 paragraphs
-                    paragraphs = selector_paragraphs
-                    logger.info(f"Using selector {selector}, found {len(paragraphs)} paragraphs")
-                    break
-            except Exception as e:
-                logger.warning(f"Error with paragraph selector {selector}: {str(e)}")
-        
-        if not paragraphs:
-            # Last resort: try to get text from all visible paragraph-like elements
-            logger.info("Trying generic selector for paragraphs")
+
+    # Scroll until the paragraphs stop changing instead of sleeping for fixed delays
+    report("scroll")
+    with span("content_wait"):
+        wait_stats = await wait_for_content(page, text_requests)
+    logger.info(
+        f"Content ready after {wait_stats['wait_ms']} ms ({wait_stats['wait_reason']}, "
+        f"{wait_stats['scrolls']} scrolls, {wait_stats['paragraphs_seen']} paragraphs); "
+        f"the fixed-delay strategy waited at least {FIXED_DELAY_FLOOR_MS} ms"
+    )
+
+    # Run the whole title and paragraph selector cascade in one round-trip
+    report("extract")
+    with span("extract"):
+        extracted = await page.evaluate(EXTRACT_SCRIPT, {
+            "titleSelectors": TITLE_SELECTORS,
+            "paragraphSelectors": PARAGRAPH_SELECTORS
+        })
+    SELECTOR_HITS.labels("title", extracted["titleSelector"] or "none").inc()
+    SELECTOR_HITS.labels(
+        "paragraphs", extracted["paragraphSelector"] or ("generic" if extracted["paragraphs"] else "none")
+    ).inc()
+
+    chapter_title = extracted["title"] or "Untitled Chapter"
+    if extracted["titleSelector"]:
+        logger.info(f"Found title with selector {extracted['titleSelector']}: {chapter_title}")
+    logger.info(f"Using chapter title: {chapter_title}")
+
+    paragraphs = extracted["paragraphs"]
+    if extracted["paragraphSelector"]:
+        logger.info(f"Using selector {extracted['paragraphSelector']}, found {len(paragraphs)} paragraphs")
+    elif paragraphs:
+        logger.info("Used generic selector for paragraphs")
+    for selector, error in extracted["errors"]:
+        logger.warning(f"Error with selector {selector}: {error}")
+
+    if not paragraphs:
+        logger.error("No content found on the page")
+        return {"error": "Could not extract content from this Wattpad page."}
+    
+    logger.info(f"Extracted {len(paragraphs)} paragraphs")
+
+    # Compare runs with BLOCK_RESOURCES=0 to see the bytes and time saved
+    stats = {"page_ms": round((time.monotonic() - started) * 1000), "source": "dom", "blocking": BLOCK_RESOURCES, **wait_stats}
+    if blocker:
+        stats.update(blocker.stats())
+    logger.info(f"Page stats: {stats}")
+
+    # JOIN WITH SINGLE NEWLINE INSTEAD OF DOUBLE NEWLINE TO SAVE SPACE
+    chapter_text = "\n".join(paragraphs)  # Use single instead of double newline separator
+
+    return {"title": chapter_title, "text": chapter_text, "stats": stats}
+
+def save_chapter(chapter_title, chapter_text):
+    """Write a scraped chapter to the uploads folder and return its filename."""
+    # Use the chapter name as the filename
+    filename = f"{sanitize_filename(chapter_title)}.txt"
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+
+    logger.info(f"Saving content to file: {file_path}")
+    with open(file_path, 'w', encoding="utf-8") as file:
+        file.write(f"{chapter_title}\n\n")  # Write chapter title first
+        file.write(chapter_text)
+
+    return filename
+
+async def discover_parts(page, story_url):
+    """Find the title and ordered part list of a Wattpad story.
+
+    Asks the story API first and falls back to the table of contents on the
+    story page. Returns ``{"title", "parts": [{"title", "url"}]}`` or a dict
+    with an ``error`` message.
+    """
+    story_url, error = normalize_url(story_url)
+    if error:
+        return {"error": error}
+
+    match = re.search(r'/story/(\d+)', story_url)
+    if match:
+        origin = "{0.scheme}://{0.netloc}".format(urlsplit(story_url))
+        api_url = origin + STORY_PARTS_API.format(story_id=match.group(1))
+        try:
+            logger.info(f"Fetching story parts from: {api_url}")
+            response = await page.request.get(api_url)
+            if response.ok:
+                data = await response.json()
+                parts = [
+                    {"title": part.get("title", ""), "url": part["url"]}
+                    for part in data.get("parts", []) if part.get("url")
+                ]
+                if parts:
+                    logger.info(f"Found {len(parts)} parts via story API")
+                    return {"title": data.get("title", "Untitled Story"), "parts": parts}
+            else:
+                logger.warning(f"Story API returned {response.status}")
+        except Exception as e:
+            logger.warning(f"Story API lookup failed: {str(e)}")
+
+    logger.info(f"Reading table of contents from: {story_url}")
+    await page.goto(story_url, timeout=30000, wait_until="domcontentloaded")
+    story = await page.evaluate(TABLE_OF_CONTENTS_SCRIPT)
+    if not story["parts"]:
+        logger.error("No parts found for story")
+        return {"error": "Could not find the parts of this Wattpad story."}
+
+    logger.info(f"Found {len(story['parts'])} parts in table of contents")
+    return story
+
+async def scrape_story(context, story_url, concurrency=4, on_part=None):
+    """Scrape every part of a story over concurrent pages of one context.
+
+    Parts are returned in story order, each with either ``text`` or an
+    ``error``; a failed part does not stop the others. ``on_part(index,
+    part)`` is called as each part finishes so callers can pipeline work.
+    """
+    page = await context.new_page()
+    try:
+        story = await discover_parts(page, story_url)
+    finally:
+        await page.close()
+    if "error" in story:
+        return story
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape_part(index, part):
+        async with semaphore:
+            page = await context.new_page()
             try:
-                all_paragraphs = page.query_selector_all('p, .p')
-                for p in all_paragraphs:
-                    content = p.text_content().strip()
-                    if content and len(content) > 20:  # Only include substantial paragraphs
-                        if content.endswith('+'):
-                            content = content[:-1].strip()
-                        paragraphs.append(content)
+                scraped = await scrape_chapter(page, part["url"])
             except Exception as e:
-                logger.warning(f"Error with generic paragraph selector: {str(e)}")
-        
-        if not paragraphs:
-            logger.error("No content found on the page")
-            print(json.dumps({"error": "Could not extract content from this Wattpad page."}))
+                logger.exception(f"Error scraping part {index + 1}: {str(e)}")
+                scraped = {"error": f"Scraping error: {str(e)}"}
+            finally:
+                await page.close()
+
+        result = {"url": part["url"], "title": part["title"], **scraped}
+        if on_part:
+            on_part(index, result)
+        return result
+
+    parts = await asyncio.gather(*(scrape_part(index, part) for index, part in enumerate(story["parts"])))
+    return {"title": story["title"], "parts": list(parts)}
+
+async def run(playwright, chapter_link):
+    browser = None
+    context = None
+
+    try:
+        logger.info(f"Starting scraping for URL: {chapter_link}")
+        with collect_timings() as timings:
+            with span("browser_launch"):
+                browser = await launch_browser(playwright)
+            with span("page_open"):
+                context = await new_context(browser)
+                page = await context.new_page()
+
+            scraped = await scrape_chapter(page, chapter_link)
+        if "error" in scraped:
+            print(json.dumps(scraped))
             return
-        
-        logger.info(f"Extracted {len(paragraphs)} paragraphs")
-        
-        # JOIN WITH SINGLE NEWLINE INSTEAD OF DOUBLE NEWLINE TO SAVE SPACE
-        chapter_text = "\n".join(paragraphs)  # Use single instead of double newline separator
-        
-        # Use the chapter name as the filename
-        filename = f"{safe_title}.txt"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        logger.info(f"Saving content to file: {file_path}")
-        with open(file_path, 'w', encoding="utf-8") as file:
-            file.write(f"{chapter_title}\n\n")  # Write chapter title first
-            file.write(chapter_text)
-        
+
+        filename = save_chapter(scraped["title"], scraped["text"])
+
         # Ensure we flush the output before exiting
-        result = json.dumps({"title": chapter_title, "filename": filename})
-        logger.info(f"Returning result: {result}")
+        result = json.dumps({
+            "title": scraped["title"], "filename": filename, "stats": scraped["stats"], "timings": timings
+        })
+        logger.debug(f"Returning result: {result}")
         print(result)
         sys.stdout.flush()
 
@@ -209,28 +736,72 @@ def run(playwright, chapter_link):
     finally:
         try:
             if context:
-                context.close()
+                await context.close()
             if browser:
-                browser.close()
+                await browser.close()
             logger.info("Browser resources cleaned up")
         except Exception as cleanup_error:
             logger.error(f"Error during cleanup: {str(cleanup_error)}")
 
+async def run_story(playwright, story_url, concurrency, summarize):
+    """Scrape all parts of a story into the uploads folder, optionally summarizing them."""
+    browser = await launch_browser(playwright)
+    try:
+        context = await new_context(browser)
+
+        on_part = None
+        if summarize:
+            # Imported here so plain scraping does not need the summarizer's settings
+            from story_batch import StoryBatch
+            batch = StoryBatch()
+            on_part = batch.add
+
+        story = await scrape_story(context, story_url, concurrency, on_part)
+        if "error" in story:
+            return story
+
+        for part in story["parts"]:
+            if "error" not in part:
+                part["filename"] = save_chapter(part["title"], part.pop("text"))
+
+        if summarize:
+            summaries = await asyncio.get_running_loop().run_in_executor(None, batch.results)
+            for part, summarized in zip(story["parts"], summaries):
+                part.update(summarized)
+        return story
+    finally:
+        await browser.close()
+        logger.info("Browser resources cleaned up")
+
+async def main(args):
+    async with async_playwright() as playwright:
+        if args.story:
+            story = await run_story(playwright, args.url, args.concurrency, args.summarize)
+            print(json.dumps(story))
+            sys.stdout.flush()
+        else:
+            await run(playwright, args.url)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Scrape a Wattpad chapter, or every part of a story.")
+    parser.add_argument("url", nargs="?", help="chapter URL, or story URL with --story")
+    parser.add_argument("--story", action="store_true", help="scrape every part of the story at URL")
+    parser.add_argument("--concurrency", type=int, default=4, help="pages scraped at once in story mode")
+    parser.add_argument("--summarize", action="store_true", help="also summarize each part in story mode")
+    args = parser.parse_args()
+
+    if not args.url:
         print(json.dumps({"error": "No URL provided!"}))
         sys.stdout.flush()
         sys.exit(1)
 
-    chapter_link = sys.argv[1]
-    logger.info(f"Starting scrape_wattpad.py with URL: {chapter_link}")
+    logger.info(f"Starting scrape_wattpad.py with URL: {args.url}")
 
     try:
-        with sync_playwright() as playwright:
-            run(playwright, chapter_link)
+        asyncio.run(main(args))
     except Exception as e:
         logger.exception(f"Unhandled exception: {str(e)}")
         error_details = {"error": f"Unhandled exception: {str(e)}", "traceback": traceback.format_exc()}
         print(json.dumps(error_details))
         sys.stdout.flush()
-        sys.exit(1)     
\ No newline at end of file
+        sys.exit(1)
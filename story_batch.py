@@ -0,0 +1,54 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+
+from rate_limit import RateLimiter
+from summarizer import run_sync, summarize_with_groq
+
+# Whole-story batches: parts summarized at once and upstream calls started per minute
+BATCH_SUMMARY_CONCURRENCY = int(os.getenv("BATCH_SUMMARY_CONCURRENCY", 2))
+BATCH_REQUESTS_PER_MINUTE = int(os.getenv("BATCH_REQUESTS_PER_MINUTE", 30))
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_SUMMARY_CONCURRENCY, thread_name_prefix="story-summary")
+batch_rate_limiter = RateLimiter(BATCH_REQUESTS_PER_MINUTE)
+
+
+class StoryBatch:
+    """Summarizes the parts of a story as they finish scraping.
+
+    ``add(index, part)`` takes a scraped part (``url``, ``title`` and either
+    ``text`` or ``error``) and starts its summary right away; ``results()``
+    waits for all of them and returns them in story order. A failed part
+    carries its own ``error`` and does not affect the others.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def add(self, index, part):
+        if "error" in part:
+            future = Future()
+            future.set_result({"url": part["url"], "title": part.get("title", ""), "error": part["error"]})
+        else:
+            future = batch_executor.submit(self._summarize, part)
+        with self._lock:
+            self._futures[index] = future
+
+    def results(self):
+        with self._lock:
+            futures = [self._futures[index] for index in sorted(self._futures)]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _summarize(part):
+        result = {"url": part["url"], "title": part["title"]}
+        batch_rate_limiter.acquire()
+        summary, error = run_sync(summarize_with_groq(part["text"].strip(), part["title"]))
+        if error:
+            result["error"] = error
+        elif not summary:
+            result["error"] = "No summary generated from API"
+        else:
+            result["summary"] = summary.replace("\n\n", "<br><br>")
+        return result
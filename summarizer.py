@@ -0,0 +1,419 @@
+"""Summarization pipeline shared by the web apps and the bulk CLI.
+
+Everything that talks to the summary backends is a coroutine. The ASGI app
+awaits them on its event loop; sync callers (the Flask routes, story
+batches, bulk_summarize.py) go through run_sync(), which runs them on that
+same loop, or on a private one when no ASGI server is running. Importing
+this module has no side effects beyond reading the configuration.
+"""
+import asyncio
+import logging
+import os
+import threading
+import zlib
+from dotenv import load_dotenv
+
+from backends import Backend, BackendRouter
+from groq_client import GroqAPIError
+from incremental import paragraphs, plan_update
+from metrics import TRUNCATIONS, span
+from summary_cache import SummaryCache, make_cache_key
+from text_cleaning import clean_text
+from token_budget import count_tokens, within_budget
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Groq API credentials
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_API_ENDPOINT = os.getenv("GROQ_API_ENDPOINT", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+
+# Pooled, retrying, rate-limited backends shared by every summary request;
+# SUMMARY_BACKENDS lists several to route between, otherwise Groq is used alone
+summary_backend = BackendRouter.from_env(Backend("groq", GROQ_API_ENDPOINT, GROQ_MODEL, GROQ_API_KEY))
+RATE_LIMITED_ERROR = "Groq rate limit reached, please try again in a minute"
+
+# Upstream summary requests in flight at the same time from this process
+ASYNC_SUMMARY_CONCURRENCY = int(os.getenv("ASYNC_SUMMARY_CONCURRENCY", 16))
+
+# Prompt sent to the model; {chapter_title} and {text} are filled in per chapter
+SYSTEM_PROMPT = "You are a helpful assistant that provides high-quality summaries of fiction content."
+PROMPT_TEMPLATE = """This is a chapter of a Wattpad story. Read the entire chapter carefully and summarize it in a story format.
+
+        IMPORTANT: Pay special attention to character names, places, and key terms exactly as they appear in the original text. Do not substitute or change any proper nouns. Do not change any character relationships and dynamics exactly as presented.
+
+        Ensure the summary is a rich, immersive retelling that mirrors the original narrative while maintaining its tone, style, and pacing in a seamless flow.
+
+        The summary must be approximately 1000-1500 words long, preserving the authenticity of the original chapter.
+
+        Do not introduce any new storylines, subplots, or additional details that are not in the original text.
+
+        Output only the summary—no introductory or concluding remarks, no explanations about word count, and no analysis.
+
+        Chapter Title: {chapter_title}
+
+        Chapter Content:
+        {text}
+        """
+
+# Prompts for chapters too long for one call: each section is summarized
+# on its own, then the partial summaries are merged
+CHUNK_PROMPT_TEMPLATE = """This is one section of a chapter of a Wattpad story. Summarize this section in a story format.
+
+        IMPORTANT: Pay special attention to character names, places, and key terms exactly as they appear in the original text. Do not substitute or change any proper nouns. Do not change any character relationships and dynamics exactly as presented.
+
+        Keep events in the order they happen and do not introduce anything that is not in the text.
+
+        Output only the summary—no introductory or concluding remarks and no analysis.
+
+        Chapter Title: {chapter_title}
+
+        Section Content:
+        {text}
+        """
+
+REDUCE_PROMPT_TEMPLATE = """These are summaries of consecutive sections of one chapter of a Wattpad story, in order. Merge them into a single summary of the whole chapter in a story format.
+
+        IMPORTANT: Pay special attention to character names, places, and key terms exactly as they appear in the section summaries. Do not substitute or change any proper nouns. Do not change any character relationships and dynamics exactly as presented.
+
+        Ensure the summary is a rich, immersive retelling that flows seamlessly from beginning to end without repeating events.
+
+        The summary must be approximately 1000-1500 words long.
+
+        Do not introduce any new storylines, subplots, or additional details that are not in the section summaries.
+
+        Output only the summary—no introductory or concluding remarks, no explanations about word count, and no analysis.
+
+        Chapter Title: {chapter_title}
+
+        Section Summaries:
+        {text}
+        """
+
+# Prompt for a chapter edited since it was summarized: the previous summary is
+# updated from the edited passages instead of re-reading the whole chapter
+REVISE_PROMPT_TEMPLATE = """This is the summary of a chapter of a Wattpad story, followed by passages the author has since edited, each shown before and after the edit. Update the summary so it matches the edited chapter.
+
+        IMPORTANT: Pay special attention to character names, places, and key terms exactly as they appear in the summary and the passages. Do not substitute or change any proper nouns. Do not change any character relationships and dynamics exactly as presented.
+
+        Keep every part of the summary that the edits do not affect as it is, with the same tone, style and length.
+
+        Output only the updated summary—no introductory or concluding remarks, no list of changes, and no analysis.
+
+        Chapter Title: {chapter_title}
+
+        {text}
+        """
+
+# Generation parameters; part of the summary cache key
+GENERATION_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 1000
+}
+CHUNK_GENERATION_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 600
+}
+
+# Llama3-8b-8192 has a context window of 8192 tokens shared by the prompt and the output
+MODEL_CONTEXT_TOKENS = 8192
+# Tokens taken by the system prompt, instructions and chat formatting around the chapter text
+PROMPT_RESERVE_TOKENS = 512
+MESSAGE_OVERHEAD_TOKENS = 4
+MAX_INPUT_TOKENS = MODEL_CONTEXT_TOKENS - GENERATION_PARAMS["max_tokens"] - PROMPT_RESERVE_TOKENS
+
+
+summary_cache = SummaryCache()
+summary_semaphore = asyncio.Semaphore(ASYNC_SUMMARY_CONCURRENCY)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def use_loop(loop):
+    """Run the summaries of sync callers on loop, the ASGI server's, from now on."""
+    global _loop
+    with _loop_lock:
+        _loop = loop
+
+
+def _summary_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="summary-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro):
+    """Run a summary coroutine from a thread that is not running an event loop and return its result.
+
+    The backend clients, the cache's flights and the concurrency limit all
+    belong to one event loop, so every caller in the process shares it. The
+    caller's context, and with it its timings, carries over.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _summary_loop()).result()
+
+
+def build_payload(text, chapter_title, prompt_template, params):
+    """Build the chat-completions request body for one summary.
+
+    Returns ``(payload, prompt_tokens)``. ``max_tokens`` is lowered when the
+    prompt would otherwise leave less room than that in the context window.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt_template.format(chapter_title=chapter_title, text=text)}
+    ]
+    prompt_tokens = sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+    max_tokens = min(params["max_tokens"], MODEL_CONTEXT_TOKENS - prompt_tokens)
+    if max_tokens < params["max_tokens"]:
+        logger.warning(f"Prompt of {prompt_tokens} tokens leaves room for only {max_tokens} output tokens")
+        TRUNCATIONS.labels("max_tokens").inc()
+    payload = {
+        "model": GROQ_MODEL,
+        "messages": messages,
+        **params,
+        "max_tokens": max(max_tokens, 1)
+    }
+    return payload, prompt_tokens
+
+
+def summary_from_response(result, chapter_title, prompt_tokens, max_tokens):
+    """Take the summary out of a chat-completions response, logging its token usage."""
+    choice = result["choices"][0]
+    usage = result.get("usage") or {}
+    logger.info(
+        f"Token usage for {chapter_title}: prompt estimated {prompt_tokens}, actual {usage.get('prompt_tokens')}; "
+        f"completion {usage.get('completion_tokens')} of {max_tokens}"
+    )
+    if choice.get("finish_reason") == "length":
+        logger.warning(f"Summary of {chapter_title} was cut off at {max_tokens} tokens")
+        TRUNCATIONS.labels("summary_length").inc()
+    return choice["message"]["content"]
+
+
+async def request_summary(text, chapter_title, prompt_template=PROMPT_TEMPLATE, params=GENERATION_PARAMS,
+                          on_delta=None):
+    """Make one chat-completions call and return (summary, error, model).
+
+    model is the one that wrote the summary, which depends on the backend
+    the request was routed to. With on_delta the summary is streamed to it
+    as it is generated.
+    """
+    payload, prompt_tokens = await asyncio.to_thread(build_payload, text, chapter_title, prompt_template, params)
+
+    async with summary_semaphore:
+        logger.info(f"Sending request to Groq API ({prompt_tokens} prompt tokens)")
+        try:
+            result = await summary_backend.chat_async(
+                payload, tokens=prompt_tokens + payload["max_tokens"], on_delta=on_delta
+            )
+        except GroqAPIError as e:
+            logger.error(f"Groq request gave up: {str(e)}")
+            return None, RATE_LIMITED_ERROR if e.rate_limited else str(e), None
+
+    summary = summary_from_response(result, chapter_title, prompt_tokens, payload["max_tokens"])
+    logger.info(f"Successfully received summary from {result['model']}, length: {len(summary)} characters")
+    return summary, None, result["model"]
+
+
+def summary_cache_key(text, chapter_title, prompt_template, params, model):
+    return make_cache_key(
+        text=text,
+        chapter_title=chapter_title,
+        model=model,
+        system_prompt=SYSTEM_PROMPT,
+        prompt_template=prompt_template,
+        params=params
+    )
+
+
+async def cached_summary(text, chapter_title, prompt_template=PROMPT_TEMPLATE, params=GENERATION_PARAMS,
+                         on_delta=None):
+    """Summarize through the cache; identical inputs share one upstream call.
+
+    Summaries are cached under the model of the backend that wrote them,
+    and one written by any configured backend is served. on_delta gets the
+    summary as it streams in, or all at once when it comes from the cache or
+    from another caller's request.
+    """
+    streamed = False
+
+    def relay(delta):
+        nonlocal streamed
+        streamed = True
+        on_delta(delta)
+
+    keys = {model: summary_cache_key(text, chapter_title, prompt_template, params, model)
+            for model in summary_backend.models()}
+
+    async def compute():
+        summary, error, model = await request_summary(
+            text, chapter_title, prompt_template, params, relay if on_delta is not None else None
+        )
+        return summary, error, keys.get(model)
+
+    summary, error = await summary_cache.get_or_compute(list(keys.values()), compute)
+    if on_delta is not None and summary and not error and not streamed:
+        on_delta(summary)
+    return summary, error
+
+
+def split_into_chunks(text, max_tokens):
+    """Split text on paragraph boundaries into chunks of at most max_tokens.
+
+    Boundaries are content-defined: a chunk may also end after any paragraph
+    whose hash has its low bits clear. An edit therefore only moves the
+    boundaries around the changed paragraphs, and the other chunks keep
+    their cache keys.
+    """
+    min_tokens = max_tokens // 2
+    chunks = []
+    current = []
+    current_len = 0
+
+    for paragraph in text.split('\n'):
+        paragraph_tokens = count_tokens(paragraph)
+        # A single paragraph longer than a chunk is cut into pieces
+        while paragraph_tokens > max_tokens:
+            if current:
+                chunks.append('\n'.join(current))
+                current, current_len = [], 0
+            cut = max(len(paragraph) * max_tokens // paragraph_tokens, 1)
+            TRUNCATIONS.labels("paragraph_split").inc()
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:]
+            paragraph_tokens = count_tokens(paragraph)
+
+        if current and current_len + paragraph_tokens + 1 > max_tokens:
+            chunks.append('\n'.join(current))
+            current, current_len = [], 0
+
+        current.append(paragraph)
+        current_len += paragraph_tokens + 1
+
+        if current_len >= min_tokens and zlib.crc32(paragraph.encode('utf-8')) & 0x7 == 0:
+            chunks.append('\n'.join(current))
+            current, current_len = [], 0
+
+    if current:
+        chunks.append('\n'.join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def sections_over_budget(text, chapter_title):
+    """Chunks to summarize separately if text is too long for one call, else None."""
+    if within_budget(text, MAX_INPUT_TOKENS):
+        return None
+    chunks = split_into_chunks(text, MAX_INPUT_TOKENS)
+    logger.info(f"Text too long ({count_tokens(text)} tokens), summarizing {len(chunks)} sections of {chapter_title}")
+    return chunks
+
+
+async def map_sections(chunks, chapter_title):
+    """Summarize a long chapter's sections concurrently; returns (partials, error).
+
+    The partial summaries are joined in order and fit in a single request.
+    """
+    while True:
+        results = await asyncio.gather(*(
+            cached_summary(chunk, chapter_title, CHUNK_PROMPT_TEMPLATE, CHUNK_GENERATION_PARAMS)
+            for chunk in chunks
+        ))
+        for index, (summary, error) in enumerate(results):
+            if error:
+                logger.error(f"Section {index + 1} of {len(chunks)} failed: {error}")
+                return None, error
+
+        # Merged summaries that are still too long go through another map pass
+        partials = '\n'.join(summary.strip() for summary, _ in results)
+        chunks = await asyncio.to_thread(sections_over_budget, partials, chapter_title)
+        if chunks is None:
+            return partials, None
+
+
+async def summarize_with_groq(text, chapter_title, on_delta=None):
+    """Clean text and summarize it; returns (summary, error).
+
+    Chapters too long for one call are summarized in sections, then the
+    section summaries are merged (and streamed to on_delta, if given).
+    """
+    with span("clean_text"):
+        text = await asyncio.to_thread(clean_text, text)
+    return await summarize_cleaned(text, chapter_title, on_delta)
+
+
+async def summarize_cleaned(text, chapter_title, on_delta=None):
+    """summarize_with_groq() for text that has already been through clean_text()."""
+    try:
+        logger.info(f"Summarizing using Groq API: {chapter_title}")
+        with span("summarize"):
+            # Tokenizing and chunking a long chapter would hold up the event loop
+            chunks = await asyncio.to_thread(sections_over_budget, text, chapter_title)
+            if chunks is None:
+                return await cached_summary(text, chapter_title, on_delta=on_delta)
+
+            with span("summarize_sections"):
+                partials, error = await map_sections(chunks, chapter_title)
+            if error:
+                return None, error
+            logger.info(f"Merging section summaries for {chapter_title}")
+            return await cached_summary(partials, chapter_title, REDUCE_PROMPT_TEMPLATE, GENERATION_PARAMS, on_delta)
+
+    except Exception as e:
+        logger.exception(f"Error in summarize_with_groq: {str(e)}")
+        return None, f"Failed to summarize: {str(e)}"
+
+
+def stored_summary_base(store, url):
+    """Return ``(paragraphs, summary)`` of the last summarized version of url, or None."""
+    try:
+        return store.summary_base(url)
+    except Exception as e:
+        logger.warning(f"Chapter store lookup failed: {str(e)}")
+        return None
+
+
+def remember_summary(store, url, paragraphs, summary):
+    """Keep a chapter's summary so later edits can be summarized incrementally."""
+    try:
+        store.put_summary(url, paragraphs, summary)
+    except Exception as e:
+        logger.warning(f"Failed to store summary: {str(e)}")
+
+
+async def summarize_update(store, url, text, chapter_title, on_delta=None):
+    """Summarize a scraped chapter, building on the summary of its previous version in store.
+
+    The chapter is diffed paragraph by paragraph against the version last
+    summarized: small edits keep that summary, moderate ones revise it from
+    the edited passages, and anything else is summarized in full. Returns
+    ``(summary, error, update)``, where update reports the path taken and
+    the prompt tokens saved.
+    """
+    with span("clean_text"):
+        text = await asyncio.to_thread(clean_text, text)
+    previous = await asyncio.to_thread(stored_summary_base, store, url)
+    plan = await asyncio.to_thread(plan_update, previous, text, MAX_INPUT_TOKENS)
+    logger.info(f"Summary of {chapter_title}: {plan.path} path, {plan.changed_paragraphs} paragraphs changed")
+
+    if plan.path == "reuse":
+        if on_delta is not None:
+            on_delta(previous[1])
+        return previous[1], None, plan.report()
+    if plan.path == "partial":
+        with span("summarize"):
+            summary, error = await cached_summary(
+                plan.revision, chapter_title, REVISE_PROMPT_TEMPLATE, GENERATION_PARAMS, on_delta
+            )
+    else:
+        summary, error = await summarize_cleaned(text, chapter_title, on_delta)
+
+    if summary and not error:
+        await asyncio.to_thread(remember_summary, store, url, paragraphs(text), summary)
+    return summary, error, plan.report()
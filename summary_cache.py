@@ -0,0 +1,203 @@
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 256))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))
+SUMMARY_CACHE_DB = os.getenv("SUMMARY_CACHE_DB", "")
+
+
+# Flight result that sends waiters back to look up or compute the summary themselves
+_LEADER_CANCELLED = object()
+
+
+def make_cache_key(**parts):
+    """Hash everything that influences a summary into a stable cache key."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class SummaryCache:
+    """Two-tier summary cache with single-flight deduplication.
+
+    The memory tier is an LRU bounded by entry count and TTL. The optional
+    disk tier is a SQLite file that every worker process can share.
+    """
+
+    def __init__(self, max_entries=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL, db_path=SUMMARY_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+        }
+        if self.db_path:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        logger.info(f"Summary cache disk tier at {self.db_path}")
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            summary, created_at = entry
+            if time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._counters["memory_hits"] += 1
+            CACHE_LOOKUPS.labels("summary", "memory_hit").inc()
+            return summary
+
+    def _set_memory(self, key, summary, created_at):
+        with self._lock:
+            self._entries[key] = (summary, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _get_disk(self, key):
+        if not self.db_path:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT summary, created_at FROM summaries WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache read failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        summary, created_at = row
+        if time.time() - created_at > self.ttl:
+            return None
+        self._set_memory(key, summary, created_at)
+        with self._lock:
+            self._counters["disk_hits"] += 1
+        CACHE_LOOKUPS.labels("summary", "disk_hit").inc()
+        return summary
+
+    def _set_disk(self, key, summary, created_at):
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                    (key, summary, created_at),
+                )
+                conn.execute("DELETE FROM summaries WHERE created_at < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache write failed: {str(e)}")
+
+    def get(self, key):
+        """Return a cached summary or None."""
+        summary = self._get_memory(key)
+        if summary is None:
+            summary = self._get_disk(key)
+        return summary
+
+    def set(self, key, summary):
+        created_at = time.time()
+        self._set_memory(key, summary, created_at)
+        self._set_disk(key, summary, created_at)
+
+    async def _run(self, fn, *args):
+        # The disk tier can wait on another worker's lock, so keep it off the event loop
+        if self.db_path:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get_or_compute(self, keys, compute):
+        """Return ``(summary, error)`` for the first of keys that is cached, awaiting ``compute()`` at most once.
+
+        ``keys`` are the summary's key under each model that may write it; a
+        hit on any of them is served. ``compute()`` returns ``(summary,
+        error, key)``, key being the one the summary is stored under.
+        Concurrent callers asking for the same keys while it runs wait for
+        its result instead of making their own upstream call. Errors are
+        handed to the waiting callers but never cached; if the caller making
+        the call is cancelled, one of the waiters makes it instead. Flights
+        belong to the running event loop.
+        """
+        flight_key = tuple(keys)
+        while True:
+            for key in keys:
+                summary = await self._run(self.get, key)
+                if summary is not None:
+                    return summary, None
+
+            with self._lock:
+                flight = self._flights.get(flight_key)
+                leader = flight is None
+                if leader:
+                    flight = asyncio.get_running_loop().create_future()
+                    self._flights[flight_key] = flight
+                    self._counters["misses"] += 1
+                else:
+                    self._counters["coalesced"] += 1
+            CACHE_LOOKUPS.labels("summary", "miss" if leader else "coalesced").inc()
+
+            if leader:
+                return await self._lead(flight_key, flight, compute)
+            result = await asyncio.shield(flight)
+            if result is not _LEADER_CANCELLED:
+                return result
+
+    async def _lead(self, flight_key, flight, compute):
+        result = _LEADER_CANCELLED
+        try:
+            summary, error, key = await compute()
+            result = (summary, error)
+            if summary and not error and key is not None:
+                await self._run(self.set, key, summary)
+        except Exception as e:
+            result = (None, f"Failed to summarize: {str(e)}")
+            raise
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.set_result(result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["in_flight"] = len(self._flights)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_tier"] = bool(self.db_path)
+        return stats
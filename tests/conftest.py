@@ -0,0 +1,73 @@
+from http.server import ThreadingHTTPServer
+import argparse
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The app is a flat set of modules, and the benchmarks double as test fixtures
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from stub_llm import make_handler
+
+# stub_llm.py's command-line defaults, minus the network ones
+STUB_LLM_DEFAULTS = dict(latency=0.0, jitter=0.0, rate_429=0.0, retry_after=0.0, completion_tokens=20, seed=0)
+
+
+class StubLLM:
+    """A stub_llm.py server running in a thread, counting the requests it gets.
+
+    The first ``reject_first`` requests are answered with 429; after that
+    ``rate_429`` applies as usual.
+    """
+
+    def __init__(self, reject_first=0, **options):
+        self.args = argparse.Namespace(**dict(STUB_LLM_DEFAULTS, **options))
+        self.reject_first = reject_first
+        self.requests = 0
+        stub = self
+        rate_429 = self.args.rate_429
+
+        class Handler(make_handler(self.args)):
+            def do_POST(self):
+                stub.requests += 1
+                if stub.reject_first:
+                    stub.args.rate_429 = 1.0 if stub.requests <= stub.reject_first else rate_429
+                super().do_POST()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_llm():
+    """Factory for in-process stub chat-completions servers, taking stub_llm.py's options."""
+    servers = []
+
+    def start(**options):
+        servers.append(StubLLM(**options))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+
+@pytest.fixture
+def dead_url():
+    """A chat-completions URL on a port nothing listens on."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    port = server.server_address[1]
+    server.server_close()
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
@@ -0,0 +1,219 @@
+import asyncio
+import time
+
+import pytest
+
+import backends
+from backends import Backend, BackendRouter, CircuitBreaker
+from groq_client import GroqAPIError
+
+PAYLOAD = {"messages": [{"role": "user", "content": "Summarize this."}], "max_tokens": 50}
+
+
+def backend(name, url, **options):
+    return Backend(name, url, f"{name}-model", requests_per_minute=0, tokens_per_minute=0,
+                   **dict({"max_retries": 0}, **options))
+
+
+def chat(router, on_delta=None):
+    async def run():
+        try:
+            return await router.chat_async(PAYLOAD, on_delta=on_delta)
+        finally:
+            await router.close()
+    return asyncio.run(run())
+
+
+def test_fails_over_to_the_next_backend(stub_llm, dead_url):
+    stub = stub_llm()
+    dead, live = backend("dead", dead_url), backend("live", stub.url)
+    result = chat(BackendRouter([dead, live]))
+    assert result["model"] == "live-model"
+    assert dead.stats.error_rate > 0
+    assert live.stats.error_rate == 0
+
+
+def test_streamed_request_fails_over_before_the_first_delta(stub_llm, dead_url):
+    stub = stub_llm(completion_tokens=3)
+    deltas = []
+    result = chat(BackendRouter([backend("dead", dead_url), backend("live", stub.url)]), deltas.append)
+    assert result["model"] == "live-model"
+    assert len(deltas) == 3
+
+
+def test_last_error_reaches_the_caller(dead_url, stub_llm):
+    stub = stub_llm(rate_429=1.0)
+    with pytest.raises(GroqAPIError) as error:
+        chat(BackendRouter([backend("dead", dead_url), backend("limited", stub.url)]))
+    assert error.value.status_code == 429
+
+
+def test_streamed_request_is_timed_to_its_first_token(stub_llm):
+    # 0.5 s spread over 10 words puts the first one about 0.05 s in
+    live = backend("live", stub_llm(latency=0.5, completion_tokens=10).url)
+    chat(BackendRouter([live]), lambda delta: None)
+    assert live.stats.latency < 0.3
+    # Time to first token says nothing about when a whole answer is due
+    assert not live.stats.recent
+
+
+def test_abandoned_request_is_not_timed(stub_llm):
+    slow = backend("slow", stub_llm(latency=1.0).url)
+
+    async def run():
+        try:
+            task = asyncio.ensure_future(slow.chat_async(PAYLOAD))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await slow.client.close()
+
+    asyncio.run(run())
+    assert slow.stats.latency is None
+    assert slow.stats.error_rate == 0
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, cooldown=60)
+    assert not breaker.record(False)
+    assert not breaker.record(False)
+    assert breaker.record(False)
+    assert breaker.is_open
+    assert not breaker.available()
+
+
+def test_breaker_lets_one_probe_through_after_the_cooldown():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.record(False)
+    assert not breaker.available()
+    time.sleep(0.06)
+    assert breaker.available()
+    breaker.begin()
+    # Only the probe goes through until it settles
+    assert not breaker.available()
+    breaker.record(False)
+    assert breaker.is_open and not breaker.available()
+    time.sleep(0.06)
+    breaker.begin()
+    breaker.record(True)
+    assert not breaker.is_open and breaker.available()
+
+
+def test_open_backend_is_skipped_then_probed(stub_llm, dead_url):
+    stub = stub_llm()
+    flaky, live = backend("flaky", dead_url), backend("live", stub.url)
+    flaky.breaker = CircuitBreaker(failures=2, cooldown=0.1)
+    router = BackendRouter([flaky, live])
+
+    async def run():
+        try:
+            for _ in range(2):
+                with pytest.raises(GroqAPIError):
+                    await flaky.chat_async(PAYLOAD)
+            assert flaky.breaker.is_open
+            assert router.ranked() == [live]
+
+            await asyncio.sleep(0.15)
+            assert flaky in router.ranked()
+            # The endpoint has recovered; the probe's success closes the breaker
+            flaky.client.endpoint = stub.url
+            result = await flaky.chat_async(PAYLOAD)
+            assert result["model"] == "flaky-model"
+            assert not flaky.breaker.is_open
+        finally:
+            await router.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_is_released(stub_llm):
+    stub = stub_llm(latency=1.0)
+    slow = backend("slow", stub.url)
+    slow.breaker = CircuitBreaker(failures=1, cooldown=0)
+    slow.breaker.record(False)
+
+    async def run():
+        try:
+            task = asyncio.ensure_future(slow.chat_async(PAYLOAD))
+            await asyncio.sleep(0.1)
+            assert slow.breaker.probing
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await slow.client.close()
+
+    asyncio.run(run())
+    assert not slow.breaker.probing
+    assert slow.breaker.available()
+
+
+def hedged_router(stub_llm, monkeypatch):
+    monkeypatch.setattr(backends, "BACKEND_HEDGE_MIN_DELAY", 0.05)
+    slow = backend("slow", stub_llm(latency=1.0).url)
+    fast = backend("fast", stub_llm(latency=0.05).url)
+    # The slow backend looks best and has a p95 of 0.1 s, so it is hedged after that
+    for _ in range(backends.BACKEND_HEDGE_MIN_SAMPLES):
+        slow.stats.record(0.1, True)
+    fast.stats.record(5.0, True)
+    return BackendRouter([slow, fast], hedge=True), slow, fast
+
+
+def test_hedge_takes_the_first_answer(stub_llm, monkeypatch):
+    router, slow, fast = hedged_router(stub_llm, monkeypatch)
+    started = time.perf_counter()
+    result = chat(router)
+    assert result["model"] == "fast-model"
+    assert time.perf_counter() - started < 0.8
+    # The losing request was cancelled; its time so far counts as a latency sample, not a failure
+    assert slow.stats.error_rate == 0
+    assert len(slow.stats.recent) == backends.BACKEND_HEDGE_MIN_SAMPLES + 1
+    assert slow.stats.recent[-1] >= 0.05
+    assert not slow.breaker.probing
+
+
+def test_streamed_request_is_not_hedged(stub_llm, monkeypatch):
+    router, slow, fast = hedged_router(stub_llm, monkeypatch)
+    monkeypatch.setattr(slow, "endpoint", stub_llm(latency=0.3, completion_tokens=3).url)
+    deltas = []
+    result = chat(router, deltas.append)
+    assert result["model"] == "slow-model"
+    assert fast.client is None
+
+
+def hedges(result):
+    return backends.BACKEND_HEDGES.labels(result)._value.get()
+
+
+def test_early_failure_fails_over_without_hedging(stub_llm, dead_url, monkeypatch):
+    monkeypatch.setattr(backends, "BACKEND_HEDGE_MIN_DELAY", 0.5)
+    dead, live = backend("dead", dead_url), backend("live", stub_llm().url)
+    for _ in range(backends.BACKEND_HEDGE_MIN_SAMPLES):
+        dead.stats.record(0.1, True)
+    live.stats.record(5.0, True)
+    fired = hedges("fired")
+    result = chat(BackendRouter([dead, live], hedge=True))
+    assert result["model"] == "live-model"
+    assert hedges("fired") == fired
+
+
+def test_cancelled_hedged_request_cancels_the_primary(stub_llm, monkeypatch):
+    router, slow, fast = hedged_router(stub_llm, monkeypatch)
+    monkeypatch.setattr(backends, "BACKEND_HEDGE_MIN_DELAY", 5.0)
+
+    async def run():
+        try:
+            task = asyncio.ensure_future(router.chat_async(PAYLOAD))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # Give the cancelled primary a moment to wind down
+            await asyncio.sleep(0.05)
+            return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        finally:
+            await router.close()
+
+    assert asyncio.run(run()) == []
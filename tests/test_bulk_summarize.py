@@ -0,0 +1,70 @@
+import argparse
+import json
+
+import pytest
+
+import bulk_summarize
+from bulk_summarize import load_checkpoint, read_chapters
+
+
+def write_lines(path, lines, end="\n"):
+    path.write_text("\n".join(lines) + end, encoding="utf-8")
+
+
+def test_checkpoint_skips_summarized_chapters(tmp_path):
+    output = tmp_path / "out.jsonl"
+    write_lines(output, [
+        json.dumps({"id": "a", "summary": "A."}),
+        json.dumps({"id": "b", "error": "Groq API error: 503"}),
+        json.dumps({"id": "c", "error": "Groq API error: 503"}),
+        json.dumps({"id": "c", "summary": "C."}),
+        json.dumps({"id": "d", "summary": "D."}),
+        '{"id": "e", "summ',
+    ], end="")
+    assert load_checkpoint(str(output)) == {"a", "c", "d"}
+    # The cut-short line is closed off so the next record starts on its own line
+    assert output.read_text(encoding="utf-8").endswith('"summ\n')
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_unreadable_chapters_become_error_records(tmp_path):
+    chapters = tmp_path / "chapters"
+    chapters.mkdir()
+    (chapters / "1.txt").write_text("Chapter One\nText.", encoding="utf-8")
+    (chapters / "2.txt").write_bytes(b"Chapter Two\n\xff\xfe broken")
+    assert [(c[0], c[3] is None) for c in read_chapters(str(chapters))] == [("1.txt", True), ("2.txt", False)]
+
+    records = tmp_path / "records.jsonl"
+    records.write_bytes(b'{"id": "x", "title": "X"}\n{"id": "y", "text": "Y."}\nnot json\n\xff\n')
+    read = list(read_chapters(str(records)))
+    assert [chapter[0] for chapter in read] == ["x", "y", "line-3", "line-4"]
+    assert [chapter[3] is None for chapter in read] == [False, True, False, False]
+
+
+def test_run_resumes_and_keeps_going_past_bad_chapters(tmp_path, monkeypatch):
+    summarized = []
+
+    def summarize_chapter(chapter_id, title, text):
+        summarized.append(chapter_id)
+        return {"id": chapter_id, "title": title, "input_tokens": 1, "summary": "S.", "summary_tokens": 1}
+
+    monkeypatch.setattr(bulk_summarize, "summarize_chapter", summarize_chapter)
+    records = tmp_path / "records.jsonl"
+    records.write_text("\n".join([
+        json.dumps({"id": "a", "title": "A", "text": "Text."}),
+        json.dumps({"id": "b", "title": "B"}),
+        json.dumps({"id": "c", "title": "C", "text": "Text."}),
+    ]) + "\n", encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+    args = argparse.Namespace(input=str(records), output=str(output), concurrency=2, limit=0)
+
+    report, status = bulk_summarize.run(args)
+    assert (report["summarized"], report["failed"], status) == (2, 1, 1)
+    assert sorted(summarized) == ["a", "c"]
+
+    # The rerun only retries the chapter that failed
+    summarized.clear()
+    report, status = bulk_summarize.run(args)
+    assert (report["skipped"], report["failed"]) == (2, 1)
+    assert summarized == []
+    assert sum(1 for _ in output.open(encoding="utf-8")) == 4
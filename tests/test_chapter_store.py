@@ -0,0 +1,81 @@
+import pytest
+
+URL = "https://www.wattpad.com/123-the-first-part"
+
+
+@pytest.fixture
+def chapter_store(tmp_path, monkeypatch):
+    # The scraper module it depends on makes its uploads folder in the working directory
+    monkeypatch.chdir(tmp_path)
+    import chapter_store
+    return chapter_store
+
+
+@pytest.fixture
+def upstream(chapter_store, monkeypatch):
+    """Stands in for the part metadata API; set ``modified`` to None to make it unreachable."""
+    class Upstream:
+        modified = "2026-01-01T00:00:00Z"
+        lookups = 0
+
+        def __call__(self, url):
+            self.lookups += 1
+            return self.modified
+
+    fake = Upstream()
+    monkeypatch.setattr(chapter_store, "fetch_part_modified", fake)
+    return fake
+
+
+@pytest.fixture
+def store(chapter_store, upstream, tmp_path):
+    store = chapter_store.ChapterStore(db_path=str(tmp_path / "chapters.db"))
+    store.put(URL, "Part One", "Some text.", "2026-01-01T00:00:00Z")
+    return store
+
+
+def test_key_is_the_part_id(chapter_store):
+    assert chapter_store.chapter_key(URL) == "part:123"
+    assert chapter_store.chapter_key("www.wattpad.com/123-renamed-part") == "part:123"
+    assert chapter_store.chapter_key("https://example.com/123") is None
+
+
+def test_fresh_chapter_is_served_without_asking(store, upstream):
+    assert store.get(URL)["text"] == "Some text."
+    assert upstream.lookups == 0
+
+
+def test_stale_chapter_is_revalidated(store, upstream, chapter_store, monkeypatch):
+    monkeypatch.setattr(chapter_store, "CHAPTER_FRESH_SECONDS", -1)
+    assert store.get(URL)["text"] == "Some text."
+    assert upstream.lookups == 1
+
+    upstream.modified = "2026-02-01T00:00:00Z"
+    assert store.get(URL) is None
+
+
+def test_unreachable_metadata_serves_until_max_age(store, upstream, chapter_store, monkeypatch):
+    monkeypatch.setattr(chapter_store, "CHAPTER_FRESH_SECONDS", -1)
+    upstream.modified = None
+    assert store.get(URL)["text"] == "Some text."
+    monkeypatch.setattr(chapter_store, "CHAPTER_MAX_AGE", -1)
+    assert store.get(URL) is None
+
+
+def test_least_recently_used_chapters_are_evicted(chapter_store, upstream, tmp_path):
+    store = chapter_store.ChapterStore(db_path=str(tmp_path / "small.db"), max_bytes=250)
+    text = "x" * 100
+    store.put("https://www.wattpad.com/1-a", "A", text)
+    store.put("https://www.wattpad.com/2-b", "B", text)
+    store.get("https://www.wattpad.com/1-a")
+    store.put("https://www.wattpad.com/3-c", "C", text)
+    assert store.get("https://www.wattpad.com/2-b") is None
+    assert store.get("https://www.wattpad.com/1-a") is not None
+    assert store.get("https://www.wattpad.com/3-c") is not None
+
+
+def test_summary_survives_a_rescrape(store):
+    store.put_summary(URL, ["Some text."], "A summary.")
+    store.put(URL, "Part One", "Some edited text.", "2026-02-01T00:00:00Z")
+    assert store.get(URL)["text"] == "Some edited text."
+    assert store.summary_base(URL) == (["Some text."], "A summary.")
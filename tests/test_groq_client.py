@@ -0,0 +1,117 @@
+import asyncio
+from email.utils import formatdate
+import time
+
+import httpx
+import pytest
+
+import groq_client
+from groq_client import AsyncGroqClient, GroqAPIError, backoff_delay, retry_after_seconds
+from rate_limit import TokenBucketLimiter
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "Summarize this."}], "max_tokens": 50}
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    # Keep the exponential part tiny so waits come from Retry-After
+    monkeypatch.setattr(groq_client, "GROQ_BACKOFF_BASE", 0.001)
+
+
+def chat(url, max_retries=2, on_delta=None, limiter=None, tokens=None):
+    async def run():
+        client = AsyncGroqClient(url, "key", limiter=limiter or TokenBucketLimiter(0, 0), max_retries=max_retries)
+        try:
+            return await client.chat(PAYLOAD, tokens, on_delta)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3", 3.0),
+    ("0.5", 0.5),
+    ("-2", 0.0),
+    ("soon", None),
+    (None, None),
+])
+def test_retry_after_seconds(value, expected):
+    headers = {"Retry-After": value} if value is not None else {}
+    assert retry_after_seconds(httpx.Response(429, headers=headers)) == expected
+
+
+def test_retry_after_http_date():
+    response = httpx.Response(429, headers={"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+    assert 25 <= retry_after_seconds(response) <= 30
+
+
+def test_backoff_waits_at_least_retry_after():
+    response = httpx.Response(429, headers={"Retry-After": "7"})
+    assert backoff_delay(0, response) == 7
+    assert backoff_delay(0) <= 0.001
+
+
+def test_retries_429_after_retry_after(stub_llm):
+    stub = stub_llm(reject_first=1, retry_after=0.3)
+    started = time.perf_counter()
+    result = chat(stub.url)
+    assert time.perf_counter() - started >= 0.3
+    assert stub.requests == 2
+    assert result["choices"][0]["message"]["content"]
+
+
+def test_429_after_every_retry_reaches_caller(stub_llm):
+    stub = stub_llm(rate_429=1.0)
+    with pytest.raises(GroqAPIError) as error:
+        chat(stub.url, max_retries=2)
+    assert error.value.status_code == 429
+    assert error.value.rate_limited
+    assert stub.requests == 3
+
+
+def test_failed_attempts_give_their_tokens_back(stub_llm):
+    stub = stub_llm(rate_429=1.0)
+    limiter = TokenBucketLimiter(0, 60_000)
+    started = time.perf_counter()
+    with pytest.raises(GroqAPIError):
+        # Four attempts at 20k tokens would need 80k from a 60k bucket
+        chat(stub.url, max_retries=3, limiter=limiter, tokens=20_000)
+    assert time.perf_counter() - started < 2
+    assert stub.requests == 4
+    state, wait = limiter._take(limiter._state, 60_000, time.time())
+    assert wait == 0.0
+
+
+def test_successful_attempt_keeps_its_tokens(stub_llm):
+    stub = stub_llm(reject_first=1)
+    limiter = TokenBucketLimiter(0, 60_000)
+    chat(stub.url, limiter=limiter, tokens=20_000)
+    # Settled to the usage the stub reported, well under the 20k estimate
+    state, wait = limiter._take(limiter._state, 60_000, time.time())
+    assert wait == 0.0
+
+
+def test_streamed_chat_relays_deltas(stub_llm):
+    stub = stub_llm(completion_tokens=5)
+    deltas = []
+    result = chat(stub.url, on_delta=deltas.append)
+    assert len(deltas) == 5
+    assert result["choices"][0]["message"]["content"] == "".join(deltas)
+    assert result["usage"]["completion_tokens"] == 5
+
+
+def test_summarizer_reports_rate_limit(stub_llm, monkeypatch):
+    import summarizer
+    from backends import Backend, BackendRouter
+
+    stub = stub_llm(rate_429=1.0)
+    backend = Backend("stub", stub.url, "stub-model", requests_per_minute=0, tokens_per_minute=0, max_retries=1)
+    monkeypatch.setattr(summarizer, "summary_backend", BackendRouter([backend]))
+
+    async def run():
+        try:
+            return await summarizer.request_summary("Some chapter text.", "Chapter 1")
+        finally:
+            await backend.client.close()
+
+    assert asyncio.run(run()) == (None, summarizer.RATE_LIMITED_ERROR, None)
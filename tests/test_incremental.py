@@ -0,0 +1,71 @@
+import pytest
+
+import incremental
+from incremental import format_revision, paragraphs, plan_update
+
+SUMMARY = "The old summary."
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word makes the change ratios exact
+    monkeypatch.setattr(incremental, "count_tokens", lambda text: len(text.split()))
+
+
+def chapter(edited=()):
+    """100 paragraphs of 10 words, 1000 tokens; the paragraphs in edited are reworded."""
+    lines = []
+    for number in range(100):
+        word = "changed" if number in edited else "word"
+        lines.append(" ".join([f"p{number}"] + [word] * 9))
+    return "\n".join(lines)
+
+
+def previous():
+    return paragraphs(chapter()), SUMMARY
+
+
+def spread(count):
+    return set(range(0, 3 * count, 3))
+
+
+def test_first_summary_is_full():
+    plan = plan_update(None, chapter(), 8000)
+    assert plan.path == "full"
+    assert plan.tokens_saved == 0
+    assert plan.total_tokens == 1000
+
+
+@pytest.mark.parametrize("edits", [0, 1, 2])
+def test_tiny_edits_reuse_the_summary(edits):
+    plan = plan_update(previous(), chapter(spread(edits)), 8000)
+    assert plan.path == "reuse"
+    assert plan.changed_paragraphs == edits
+    assert plan.tokens_saved == 1000
+
+
+@pytest.mark.parametrize("edits", [3, 30])
+def test_moderate_edits_revise_the_summary(edits):
+    plan = plan_update(previous(), chapter(spread(edits)), 8000)
+    assert plan.path == "partial"
+    assert plan.report()["changed_ratio"] == edits / 100
+    assert SUMMARY in plan.revision
+    assert plan.revision.count("Before:") == edits
+    assert 0 < plan.tokens_saved < 1000
+
+
+def test_large_edits_resummarize():
+    plan = plan_update(previous(), chapter(spread(31)), 8000)
+    assert plan.path == "full"
+    assert plan.changed_paragraphs == 31
+
+
+def test_revision_too_long_for_the_model_resummarizes():
+    plan = plan_update(previous(), chapter(spread(10)), 50)
+    assert plan.path == "full"
+
+
+def test_revision_lists_removed_and_added_passages():
+    revision = format_revision(SUMMARY, [(["gone"], []), ([], ["new"])])
+    assert "Before:\ngone\nAfter:\n(removed)" in revision
+    assert "Before:\n(nothing)\nAfter:\nnew" in revision
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+
+import pytest
+
+from jobs import JobQueue, QueueFullError
+
+
+def test_duplicate_key_joins_the_unfinished_job():
+    queue = JobQueue(workers=2)
+    release = threading.Event()
+    calls = []
+
+    def work(job, value):
+        calls.append(value)
+        release.wait(5)
+        return {"value": value}, None
+
+    job, created = queue.submit("url", work, 1)
+    again, created_again = queue.submit("url", work, 2)
+    assert created and not created_again
+    assert again is job
+
+    release.set()
+    for _ in range(100):
+        if job.finished:
+            break
+        threading.Event().wait(0.01)
+    assert job.status == "done" and job.result == {"value": 1}
+    assert calls == [1]
+
+    # A finished job no longer absorbs new requests
+    _, created = queue.submit("url", work, 3)
+    assert created
+
+
+def test_full_queue_refuses_new_keys():
+    async def main():
+        queue = JobQueue(max_pending=2)
+        release = asyncio.Event()
+
+        async def work(job):
+            await release.wait()
+            return {}, None
+
+        queue.submit_async("a", work)
+        queue.submit_async("b", work)
+        with pytest.raises(QueueFullError):
+            queue.submit_async("c", work)
+        # Requests for a key already queued still join it
+        _, created = queue.submit_async("a", work)
+        assert not created
+        assert queue.depth() == 2
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert queue.depth() == 0
+        queue.submit_async("c", work)
+
+    asyncio.run(main())
+
+
+def test_failures_are_reported_on_the_job():
+    async def main():
+        queue = JobQueue()
+
+        async def fails(job):
+            return None, "Scraping timed out"
+
+        async def raises(job):
+            raise RuntimeError("boom")
+
+        failed, _ = queue.submit_async("a", fails)
+        crashed, _ = queue.submit_async("b", raises)
+        await asyncio.sleep(0.01)
+        return failed, crashed
+
+    failed, crashed = asyncio.run(main())
+    assert failed.to_dict()["status"] == "failed"
+    assert failed.error == "Scraping timed out"
+    assert "boom" in crashed.error
+
+
+def test_subscribers_see_past_and_future_events():
+    async def main():
+        queue = JobQueue()
+        step = asyncio.Event()
+
+        async def work(job):
+            job.publish("progress", {"stage": "navigate"})
+            await step.wait()
+            job.publish("token", {"text": "Hi"})
+            return {"summary": "Hi"}, None
+
+        job, _ = queue.submit_async("url", work)
+        await asyncio.sleep(0.01)
+        events = job.subscribe()
+        step.set()
+        received = []
+        while (item := await events.get()) is not None:
+            received.append(item)
+        # A stream joining after the end goes straight to the result
+        late = job.subscribe()
+        return received, await late.get(), job
+
+    received, late, job = asyncio.run(main())
+    assert received == [("progress", {"stage": "navigate"}), ("token", {"text": "Hi"})]
+    assert late is None
+    assert job.result == {"summary": "Hi"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The apps keep their chapter store and uploads in the working directory
+    monkeypatch.chdir(tmp_path)
+    from starlette.testclient import TestClient
+    import asgi
+    import summarizer
+
+    # The app's lifespan hands its loop to the summarizer; don't leave the closed loop behind
+    monkeypatch.setattr(summarizer, "_loop", summarizer._loop)
+
+    release = asyncio.Event()
+
+    async def blocked(job, url, want_timings=False):
+        await release.wait()
+        return {}, None
+
+    monkeypatch.setattr(asgi, "job_queue", JobQueue(max_pending=1))
+    monkeypatch.setattr(asgi, "scrape_and_summarize", blocked)
+    with TestClient(asgi.app) as client:
+        yield client
+        client.portal.call(release.set)
+
+
+def test_scrape_routes_answer_429_when_full(client):
+    first = client.post("/scrape", json={"url": "https://www.wattpad.com/1-a"})
+    assert first.status_code == 202
+    # The same chapter joins the queued job
+    again = client.post("/scrape", json={"url": "https://www.wattpad.com/1-a"})
+    assert again.status_code == 200
+    assert again.json()["job_id"] == first.json()["job_id"]
+
+    for response in (client.post("/scrape", json={"url": "https://www.wattpad.com/2-b"}),
+                     client.get("/scrape/stream", params={"url": "https://www.wattpad.com/2-b"})):
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from rate_limit import TokenBucketLimiter
+
+
+def elapsed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def test_unlimited_never_waits():
+    limiter = TokenBucketLimiter(0, 0)
+    assert elapsed(lambda: [limiter.acquire(10_000) for _ in range(100)]) < 0.1
+
+
+def test_request_bucket_waits_for_refill():
+    limiter = TokenBucketLimiter(600, 0)
+    assert elapsed(lambda: [limiter.acquire() for _ in range(600)]) < 0.5
+    # One request refills every 0.1 s
+    assert 0.05 <= elapsed(limiter.acquire) < 0.5
+
+
+def test_token_bucket_waits_for_refill():
+    limiter = TokenBucketLimiter(0, 60_000)
+    assert elapsed(limiter.acquire, 60_000) < 0.1
+    # 1000 tokens refill every second
+    assert 0.15 <= elapsed(limiter.acquire, 200) < 0.6
+
+
+def test_wait_covers_the_missing_tokens():
+    limiter = TokenBucketLimiter(60, 6000)
+    state, wait = limiter._take((1.0, 100.0, 0.0), 700, 0.0)
+    assert state is None
+    # 600 tokens short at 100 tokens per second
+    assert wait == 6.0
+
+
+def test_oversized_request_waits_for_a_full_bucket():
+    limiter = TokenBucketLimiter(0, 6000)
+    state, wait = limiter._take((0.0, 6000.0, 0.0), 50_000, 0.0)
+    assert wait == 0.0
+    assert state[1] == 0.0
+
+
+def test_async_acquire_waits_without_blocking_the_loop():
+    limiter = TokenBucketLimiter(0, 60_000)
+    ticks = []
+
+    async def tick():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        await limiter.acquire_async(60_000)
+        started = time.perf_counter()
+        await asyncio.gather(limiter.acquire_async(200), tick())
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) >= 0.15
+    assert len(ticks) == 5
+
+
+def test_adjust_refunds_unused_tokens():
+    limiter = TokenBucketLimiter(0, 60_000)
+    limiter.acquire(60_000)
+    limiter.adjust(60_000, 1000)
+    assert elapsed(limiter.acquire, 50_000) < 0.1
+
+
+def test_workers_share_the_sqlite_bucket(tmp_path):
+    db_path = str(tmp_path / "limits.db")
+    first = TokenBucketLimiter(0, 60_000, db_path)
+    second = TokenBucketLimiter(0, 60_000, db_path)
+    other = TokenBucketLimiter(0, 60_000, db_path, name="other")
+    first.acquire(60_000)
+    assert elapsed(second.acquire, 200) >= 0.15
+    assert elapsed(other.acquire, 60_000) < 0.1
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+PART_URL = "https://www.wattpad.com/123-a-part"
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.ok = status < 400
+        self.body = body
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def text(self):
+        return self.body
+
+
+class FakePage:
+    """A page whose request context answers the part-info and storytext APIs."""
+
+    def __init__(self, pages, text_pages):
+        self.request = self
+        self.info = {"id": 123, "title": "A Part", "modifyDate": "2026-01-01T00:00:00Z"}
+        if pages is not None:
+            self.info["pages"] = pages
+        self.text_pages = text_pages
+
+    async def get(self, url):
+        if "/story_parts/" in url:
+            return FakeResponse(200, json.dumps(self.info))
+        page = int(url.rsplit("page=", 1)[1])
+        return self.text_pages.get(page, FakeResponse(200, ""))
+
+
+def text_page(number):
+    return FakeResponse(200, "".join(f"<p>Paragraph {i} of page {number}.</p>" for i in range(3)))
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    # The scraper module makes its uploads folder in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    import scrape_wattpad
+    return scrape_wattpad
+
+
+@pytest.fixture
+def fetch(scraper):
+    return lambda page: asyncio.run(scraper.fetch_chapter_from_api(page, PART_URL))
+
+
+def test_reads_every_known_page(fetch):
+    result = fetch(FakePage(2, {1: text_page(1), 2: text_page(2)}))
+    assert len(result["paragraphs"]) == 6
+    assert result["modified"] == "2026-01-01T00:00:00Z"
+
+
+@pytest.mark.parametrize("second_page", [FakeResponse(503, "busy"), FakeResponse(200, "")])
+def test_missing_known_page_falls_back_to_render(fetch, second_page):
+    assert fetch(FakePage(3, {1: text_page(1), 2: second_page, 3: text_page(3)})) is None
+
+
+def test_unknown_page_count_stops_at_the_first_empty_page(fetch):
+    result = fetch(FakePage(None, {1: text_page(1), 2: text_page(2)}))
+    assert len(result["paragraphs"]) == 6
+
+
+def test_failed_page_with_unknown_count_falls_back_to_render(fetch):
+    assert fetch(FakePage(None, {1: text_page(1), 2: FakeResponse(500, "")})) is None
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="fetch"):
+        self.url = url
+        self.resource_type = resource_type
+
+
+@pytest.mark.parametrize("url, tracked", [
+    ("https://www.wattpad.com/apiv2/storytext?id=123&page=2", True),
+    ("https://www.wattpad.com/apiv2/?m=storytext&id=123&page=2", True),
+    ("https://api.wattpad.com/v4/parts/123/comments", False),
+    ("https://www.wattpad.com/api/v3/users/me", False),
+    ("https://track.wattpad.com/event?name=read", False),
+    ("https://storytext.example.com/apiv2/storytext?id=123", False),
+])
+def test_content_wait_only_tracks_text_requests(scraper, url, tracked):
+    requests = scraper.InFlightRequests("www.wattpad.com")
+    request = FakeRequest(url)
+    requests._on_request(request)
+    assert (request in requests.pending) is tracked
+    assert requests.idle.is_set() is not tracked
+    requests._on_done(request)
+    assert requests.idle.is_set()
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from summary_cache import SummaryCache, make_cache_key
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Upstream:
+    """A compute() that counts its calls and answers after a short wait."""
+
+    def __init__(self, summary="A summary.", error=None, delay=0.05):
+        self.calls = 0
+        self.summary = summary
+        self.error = error
+        self.delay = delay
+
+    def __call__(self, key="key"):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            return self.summary, self.error, key
+        return compute
+
+
+def test_key_covers_every_part():
+    key = make_cache_key(text="t", chapter_title="c", model="m")
+    assert key == make_cache_key(model="m", chapter_title="c", text="t")
+    assert key != make_cache_key(text="t", chapter_title="c", model="other")
+
+
+def test_concurrent_identical_requests_make_one_call():
+    cache = SummaryCache(db_path="")
+    upstream = Upstream()
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute(["key"], upstream()) for _ in range(10)))
+
+    assert run(main()) == [("A summary.", None)] * 10
+    assert upstream.calls == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"]) == (1, 9)
+    # Later requests are served from the cache
+    assert run(cache.get_or_compute(["key"], upstream())) == ("A summary.", None)
+    assert upstream.calls == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_hit_under_any_model_key_is_served():
+    cache = SummaryCache(db_path="")
+    cache.set("model-b", "From model B.")
+    upstream = Upstream()
+    assert run(cache.get_or_compute(["model-a", "model-b"], upstream())) == ("From model B.", None)
+    assert upstream.calls == 0
+
+
+def test_errors_are_shared_but_not_cached():
+    cache = SummaryCache(db_path="")
+    failing = Upstream(summary=None, error="Groq API error: 503")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute(["key"], failing()) for _ in range(3)))
+
+    assert run(main()) == [(None, "Groq API error: 503")] * 3
+    assert failing.calls == 1
+    working = Upstream()
+    assert run(cache.get_or_compute(["key"], working())) == ("A summary.", None)
+    assert working.calls == 1
+
+
+def test_cancelled_leader_hands_the_call_to_a_waiter():
+    cache = SummaryCache(db_path="")
+    upstream = Upstream(delay=0.1)
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute(["key"], upstream()))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.ensure_future(cache.get_or_compute(["key"], upstream())) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    assert run(main()) == [("A summary.", None)] * 3
+    # The cancelled call, then one more by a waiter for all of them
+    assert upstream.calls == 2
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_lru_evicts_the_oldest_entry():
+    cache = SummaryCache(max_entries=2, db_path="")
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_is_shared(tmp_path):
+    db_path = str(tmp_path / "summaries.db")
+    SummaryCache(db_path=db_path).set("key", "On disk.")
+    other = SummaryCache(db_path=db_path)
+    upstream = Upstream()
+    assert run(other.get_or_compute(["key"], upstream())) == ("On disk.", None)
+    assert upstream.calls == 0
+    assert other.stats()["disk_hits"] == 1
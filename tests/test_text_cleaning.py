@@ -0,0 +1,27 @@
+import pytest
+
+from bench_clean_text import reference_clean_text, reference_split_chapter, synthetic_chapter
+from text_cleaning import clean_text, split_chapter
+
+
+@pytest.mark.parametrize("size", [0, 100, 10_000, 200_000])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_reference_on_synthetic_chapters(size, seed):
+    content = synthetic_chapter(size, seed)
+    assert split_chapter(content) == reference_split_chapter(content)
+    _, text = split_chapter(content)
+    assert clean_text(text) == reference_clean_text(text)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    "a" + " " * 7 + "b",
+    "a" + " " * 64 + "b",
+    "".join("." * n + " x " for n in range(1, 12)),
+    "one\n \t \n\n  \ntwo",
+    "\n\n  lead and trail  \n\n",
+    "tabs\tstay\t\tas they are",
+])
+def test_matches_reference_on_edge_cases(text):
+    assert clean_text(text) == reference_clean_text(text)
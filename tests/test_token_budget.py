@@ -0,0 +1,47 @@
+import pytest
+
+import token_budget
+from token_budget import count_tokens, get_tokenizer
+
+
+class WordTokenizer:
+    name = "words"
+
+    def count(self, text):
+        return len(text.split())
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Make the next tokenizer loads return the given tokenizers in turn."""
+    monkeypatch.setattr(token_budget, "_tokenizer", None)
+    monkeypatch.setattr(token_budget, "TOKENIZER_RETRY_SECONDS", 60)
+    token_budget._count_short.cache_clear()
+    results = []
+    monkeypatch.setattr(token_budget, "_load_tokenizer", lambda: results.pop(0))
+    yield results
+    token_budget._count_short.cache_clear()
+
+
+def test_real_tokenizer_is_kept(loads):
+    loads.append(WordTokenizer())
+    assert get_tokenizer() is get_tokenizer()
+
+
+def test_heuristic_is_retried_after_a_while(loads, monkeypatch):
+    loads.extend([token_budget._Heuristic(), WordTokenizer()])
+    text = "four words right here"
+    assert count_tokens(text) == len(text) // 4
+    # Within the retry window the heuristic stays
+    assert get_tokenizer().name == "heuristic"
+
+    monkeypatch.setattr(token_budget, "_tokenizer_retry_at", 0.0)
+    assert get_tokenizer().name == "words"
+    # Counts cached from the heuristic are dropped
+    assert count_tokens(text) == 4
+
+
+def test_within_budget_skips_obvious_fits(loads):
+    loads.append(WordTokenizer())
+    assert token_budget.within_budget("a b c", 100)
+    assert not token_budget.within_budget("word " * 50, 20)
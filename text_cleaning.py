@@ -0,0 +1,26 @@
+import re
+
+# Blank lines, including ones holding only whitespace, collapse to one newline
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+
+def clean_text(text):
+    """Clean up text to reduce token count.
+
+    Collapses blank lines to a single newline, runs of spaces to one space
+    and runs of dots to an ellipsis, then strips the ends. Spaces and dots
+    use repeated str.replace, which is several times faster than a regex
+    substitution per match; every pass shortens each run, so a few passes do.
+    """
+    text = _BLANK_LINES_RE.sub('\n', text)
+    while '  ' in text:
+        text = text.replace('  ', ' ')
+    while '....' in text:
+        text = text.replace('....', '...')
+    return text.strip()
+
+
+def split_chapter(content):
+    """Split an uploaded chapter into ``(title, text)``; the title is the first line."""
+    title, _, text = content.partition('\n')
+    return title.strip(), text.strip()
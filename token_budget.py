@@ -0,0 +1,131 @@
+from functools import lru_cache
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer configuration. TOKENIZER_FILE (a tokenizer.json) or TOKENIZER_NAME (a
+# Hugging Face repo) load the model's own tokenizer; otherwise tiktoken's
+# cl100k_base, whose vocabulary Llama 3 extends, is used as a close stand-in.
+TOKENIZER_FILE = os.getenv("TOKENIZER_FILE", "")
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME", "")
+TOKENIZER_FALLBACK_ENCODING = "cl100k_base"
+# Seconds before loading a tokenizer is tried again while counts fall back to
+# the heuristic, e.g. when tiktoken could not download its encoding
+TOKENIZER_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", 300))
+# Longest text whose token count is cached
+TOKEN_COUNT_CACHE_MAX_CHARS = 2048
+
+_tokenizer = None
+_tokenizer_retry_at = 0.0
+_tokenizer_lock = threading.Lock()
+
+
+class _Heuristic:
+    """Last resort when no tokenizer library is available: 4 chars per token."""
+
+    name = "heuristic"
+
+    def count(self, text):
+        return len(text) // 4
+
+
+class _HFTokenizer:
+    def __init__(self, tokenizer, name):
+        self.tokenizer = tokenizer
+        self.name = name
+
+    def count(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class _TiktokenTokenizer:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def _load_tokenizer():
+    """Load the best available tokenizer, or the heuristic if none can be loaded."""
+    if TOKENIZER_FILE or TOKENIZER_NAME:
+        try:
+            from tokenizers import Tokenizer
+            if TOKENIZER_FILE:
+                tokenizer = _HFTokenizer(Tokenizer.from_file(TOKENIZER_FILE), TOKENIZER_FILE)
+            else:
+                tokenizer = _HFTokenizer(Tokenizer.from_pretrained(TOKENIZER_NAME), TOKENIZER_NAME)
+            logger.info(f"Counting tokens with {tokenizer.name}")
+            return tokenizer
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {TOKENIZER_FILE or TOKENIZER_NAME}: {str(e)}")
+
+    try:
+        import tiktoken
+        tokenizer = _TiktokenTokenizer(tiktoken.get_encoding(TOKENIZER_FALLBACK_ENCODING))
+        logger.info(f"Counting tokens with {tokenizer.name}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"No tokenizer available, estimating 4 characters per token "
+                       f"for the next {TOKENIZER_RETRY_SECONDS:.0f}s: {str(e)}")
+        return _Heuristic()
+
+
+def get_tokenizer():
+    """Return the process's tokenizer, loading it on first use.
+
+    A real tokenizer is kept for good. The heuristic is only kept for
+    TOKENIZER_RETRY_SECONDS, so a failed download does not leave the
+    process estimating tokens until it restarts.
+    """
+    global _tokenizer, _tokenizer_retry_at
+    tokenizer = _tokenizer
+    if tokenizer is not None and (not isinstance(tokenizer, _Heuristic) or time.monotonic() < _tokenizer_retry_at):
+        return tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None or (isinstance(_tokenizer, _Heuristic) and time.monotonic() >= _tokenizer_retry_at):
+            loaded = _load_tokenizer()
+            if isinstance(loaded, _Heuristic):
+                _tokenizer_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            elif _tokenizer is not None:
+                # Drop the counts estimated while the heuristic stood in
+                _count_short.cache_clear()
+            _tokenizer = loaded
+        return _tokenizer
+
+
+@lru_cache(maxsize=4096)
+def _count_short(text):
+    return get_tokenizer().count(text)
+
+
+def count_tokens(text):
+    """Number of tokens text encodes to.
+
+    Counts of short texts (paragraphs, titles) are cached; whole chapters
+    and prompts are not, so the cache never holds on to them.
+    """
+    if not text:
+        return 0
+    if len(text) <= TOKEN_COUNT_CACHE_MAX_CHARS:
+        return _count_short(text)
+    return get_tokenizer().count(text)
+
+
+def within_budget(text, budget):
+    """Whether text fits in budget tokens, skipping the tokenizer when it obviously does.
+
+    A byte-level tokenizer never produces more tokens than there are UTF-8
+    bytes, so short texts are answered without encoding them.
+    """
+    if len(text) * 4 <= budget or len(text.encode("utf-8")) <= budget:
+        return True
+    return count_tokens(text) <= budget
+
+
+def tokenizer_name():
+    return get_tokenizer().name